@@ -119,24 +119,23 @@ class ItemAction (Action):
 class PickupAction (Action):
     # Pickup an Item and add it to the inventory, if there is room for it.
     def perform(self) -> None:
-        for item in self.engine.game_map.items:
-            if self.entity.pos == item.pos:
-                if hasattr(self.entity, "inventory"):
-                    if len(self.entity.inventory.items) >= self.entity.inventory.capacity:
-                        if self.entity is self.engine.player:
-                            raise exceptions.Impossible("Your inventory is full.")
-                        else:
-                            raise exceptions.Impossible(f"The {self.entity.name}'s inventory is full.")
+        for item in self.engine.game_map.get_items_at_location(self.entity.pos):
+            if hasattr(self.entity, "inventory"):
+                if len(self.entity.inventory.items) >= self.entity.inventory.capacity:
+                    if self.entity is self.engine.player:
+                        raise exceptions.Impossible("Your inventory is full.")
                     else:
-                        item.container = self.entity.inventory
-                        if self.entity is self.engine.player:
-                            self.engine.message_log.add_message(f"You picked up the {item.name}.")
-                            return
+                        raise exceptions.Impossible(f"The {self.entity.name}'s inventory is full.")
                 else:
+                    item.container = self.entity.inventory
                     if self.entity is self.engine.player:
-                        raise exceptions.Impossible("You have no inventory.")
-                    else:
-                        raise exceptions.Impossible(f"The {self.entity.name} has no inventory.")
+                        self.engine.message_log.add_message(f"You picked up the {item.name}.")
+                        return
+            else:
+                if self.entity is self.engine.player:
+                    raise exceptions.Impossible("You have no inventory.")
+                else:
+                    raise exceptions.Impossible(f"The {self.entity.name} has no inventory.")
 
 
 class DropItem (ItemAction):
@@ -165,6 +164,7 @@ class StairsAction (Action):
             self.engine.game_world.current_floor_num += 1
             self.engine.player.place(self.engine.game_world.current_floor.up_stairs, self.engine.game_world.current_floor)
             self.engine.game_map = self.engine.game_world.current_floor
+            self.engine.game_world.prepare_next_floor()
         elif self.entity.pos == self.engine.game_map.up_stairs:
             self.engine.message_log.add_message("You ascend the staircase.", color.stairs)
             
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import argparse
+import collections
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import factories.entity
+import generated_structures
+import procgen
+from engine import Engine
+from seeding import seed_all
+
+
+# Room types that can be passed to --rooms, by name.
+ROOMS = {
+    "rectangular": generated_structures.RectangularRoom,
+    "cross": generated_structures.CrossRoom,
+    "marching": generated_structures.MarchingRoom,
+    "cellular": generated_structures.CellularRoom,
+    "flooded": generated_structures.FloodedCellsRoom,
+}
+
+# Target, seed, floor number, map size, and the Tower's parameters.
+Job = Tuple[str, int, int, int, dict]
+
+
+def generate(job: Job) -> Dict[str, object]:
+    # Generate one floor, or one Tower, and measure it. Every job seeds the
+    # random generators from it's own seed, so a result only depends on the
+    # seed, never on which worker ran it or what that worker ran before.
+    target, seed, floor_num, size, options = job
+    options = dict(options)
+    if "room_options" in options:
+        options["room_options"] = [ROOMS[name] for name in options["room_options"]]
+
+    seed_all(seed)
+    stats: Dict[str, object] = {"target": target, "seed": seed, "failed": False}
+    start = time.perf_counter()
+    try:
+        if target == "dungeon":
+            # The first floor needs an engine to place the player in.
+            engine = Engine(factories.entity.player.spawn()) if not floor_num else None
+            dungeon = procgen.generate_dungeon(size, size, engine, floor_num, options)
+            walkable = dungeon.tiles["walkable"]
+            stats["rooms"] = dungeon.room_count
+            stats["actors"] = len(dungeon.actors)
+            stats["items"] = len(dungeon.items)
+            stats["entities"] = len(dungeon.entities)
+        else:
+            tower = generated_structures.Tower(0, 0, size, size, **options)
+            walkable = tower.tiles["walkable"]
+            stats["rooms"] = len(tower.leaves)
+    except Exception as exc:
+        # Any error fails this seed alone, like a GenerationException would,
+        # so the rest of the batch still gets reported.
+        stats["seconds"] = time.perf_counter() - start
+        stats["failed"] = True
+        stats["error"] = type(exc).__name__
+        return stats
+    stats["seconds"] = time.perf_counter() - start
+    stats["walkable"] = float(walkable.mean())
+    return stats
+
+
+def run_batch(
+    jobs: Sequence[Job],
+    workers: int,
+    chunksize: int = 16,
+) -> List[Dict[str, object]]:
+    # Run the jobs over a pool of worker processes, or in this process if
+    # there's only one worker, so it can be profiled.
+    if workers <= 1:
+        return [generate(job) for job in jobs]
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as executor:
+        return list(executor.map(generate, jobs, chunksize=chunksize))
+
+
+def percentile(values: Sequence[float], percent: float) -> float:
+    # Nearest rank percentile of sorted values.
+    index = min(len(values) - 1, math.ceil(percent / 100 * len(values)) - 1)
+    return values[max(0, index)]
+
+
+def summarize(results: Iterable[Dict[str, object]]) -> Dict[str, Dict[str, object]]:
+    # Aggregate results by target.
+    by_target: Dict[str, List[Dict[str, object]]] = {}
+    for result in results:
+        by_target.setdefault(result["target"], []).append(result)
+
+    summary = {}
+    for target, rows in by_target.items():
+        seconds = sorted(row["seconds"] for row in rows)
+        succeeded = [row for row in rows if not row["failed"]]
+        entry = {
+            "count": len(rows),
+            "failures": len(rows) - len(succeeded),
+            "failure_rate": (len(rows) - len(succeeded)) / len(rows),
+            "ms": {
+                name: percentile(seconds, percent) * 1000
+                for name, percent in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))
+            },
+            "failed_seeds": [row["seed"] for row in rows if row["failed"]],
+            "errors": dict(collections.Counter(row["error"] for row in rows if row["failed"])),
+        }
+        for field in ("rooms", "walkable", "entities", "actors", "items"):
+            values = np.array([row[field] for row in succeeded if field in row], dtype=float)
+            if len(values):
+                entry[field] = {
+                    "mean": float(values.mean()), "std": float(values.std()),
+                    "min": float(values.min()), "max": float(values.max()),
+                }
+        summary[target] = entry
+    return summary
+
+
+def iter_report(summary: Dict[str, Dict[str, object]]) -> Iterator[str]:
+    for target, entry in summary.items():
+        ms = entry["ms"]
+        yield f"{target}: {entry['count']} seeds, {entry['failures']} failed ({entry['failure_rate']:.1%})"
+        yield f"  time   p50 {ms['p50']:8.2f}ms  p90 {ms['p90']:8.2f}ms  p99 {ms['p99']:8.2f}ms  max {ms['max']:8.2f}ms"
+        for field in ("rooms", "walkable", "entities", "actors", "items"):
+            if field in entry:
+                stats = entry[field]
+                yield (
+                    f"  {field:<8} mean {stats['mean']:8.2f}  std {stats['std']:7.2f}"
+                    f"  min {stats['min']:7.2f}  max {stats['max']:7.2f}"
+                )
+        for error, count in sorted(entry["errors"].items(), key=lambda item: -item[1]):
+            yield f"  {error:<24} {count} failed"
+        if entry["failed_seeds"]:
+            seeds = entry["failed_seeds"]
+            yield f"  failed seeds: {' '.join(map(str, seeds[:20]))}{' ...' if len(seeds) > 20 else ''}"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate many floors across a process pool and report on them.")
+    parser.add_argument("-n", "--seeds", type=int, default=1000, help="how many seeds to generate")
+    parser.add_argument("-s", "--start", type=int, default=0, help="the first seed, the rest follow on from it")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes, 1 runs in this process")
+    parser.add_argument("-t", "--target", choices=("dungeon", "tower", "both"), default="both")
+    parser.add_argument("--floor", type=int, default=1, help="floor number passed to generate_dungeon")
+    parser.add_argument("--map-size", type=int, default=80, help="width and height of generated dungeons")
+    parser.add_argument("--tower-size", type=int, default=60, help="width and height of Towers generated alone")
+    parser.add_argument("--req-size", type=int, help="Tower req_size")
+    parser.add_argument("--split-chance", type=float, help="Tower split_chance")
+    parser.add_argument("--split-chance-reduction", type=float, help="Tower split_chance_reduction")
+    parser.add_argument("--rooms", help=f"comma separated Tower room_options, from {', '.join(ROOMS)}")
+    parser.add_argument("--chunksize", type=int, default=16, help="seeds sent to a worker at a time")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--raw", metavar="PATH", help="also write every seed's result to PATH as JSON")
+    args = parser.parse_args(argv)
+
+    options = {}
+    for name in ("req_size", "split_chance", "split_chance_reduction"):
+        if getattr(args, name) is not None:
+            options[name] = getattr(args, name)
+    if args.rooms:
+        options["room_options"] = [name.strip() for name in args.rooms.split(",")]
+        for name in options["room_options"]:
+            if name not in ROOMS:
+                parser.error(f"unknown room type {name!r}")
+
+    targets = ("dungeon", "tower") if args.target == "both" else (args.target,)
+    jobs: List[Job] = []
+    for target in targets:
+        size = args.map_size if target == "dungeon" else args.tower_size
+        for seed in range(args.start, args.start + args.seeds):
+            jobs.append((target, seed, args.floor, size, options))
+
+    start = time.perf_counter()
+    results = run_batch(jobs, args.jobs, args.chunksize)
+    wall = time.perf_counter() - start
+
+    summary = summarize(results)
+    if args.raw:
+        with open(args.raw, "w") as file:
+            json.dump(results, file)
+
+    if args.json:
+        print(json.dumps({"options": options, "jobs": args.jobs, "seconds": wall, "summary": summary}, indent=2))
+    else:
+        print(f"{len(jobs)} jobs on {args.jobs} workers in {wall:.2f}s ({len(jobs) / wall:.1f}/s)")
+        if options:
+            print(f"options {options}")
+        for line in iter_report(summary):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Timing harness for the game's hot paths.
+
+Benchmarks are registered with the `benchmark` decorator, as a function that
+takes one parameter (usually a map size or an actor count), does any untimed
+setup, and returns the callable to time. Setup is redone for every repeat,
+with the random generators reseeded first, so each sample is taken from the
+same starting state.
+"""
+from __future__ import annotations
+
+import json
+import platform
+import statistics
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import tcod
+
+from seeding import seed_all
+
+
+class Benchmark:
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[object], Callable[[], object]],
+        params: Sequence[object],
+        seed: int = 0,
+        repeat: int = 5,
+    ) -> None:
+        self.name = name
+        self.factory = factory
+        self.params = params
+        self.seed = seed
+        self.repeat = repeat
+
+    def key(self, param: object) -> str:
+        return f"{self.name}[{param}]"
+
+    def run(self, param: object, repeat: Optional[int] = None) -> Dict[str, float]:
+        samples = []
+        for i in range(repeat or self.repeat):
+            seed_all(self.seed)
+            timed = self.factory(param)
+            seed_all(self.seed + 1)
+            start = time.perf_counter()
+            timed()
+            samples.append(time.perf_counter() - start)
+
+        return {
+            "min": min(samples),
+            "median": statistics.median(samples),
+            "mean": statistics.fmean(samples),
+            "repeat": len(samples),
+        }
+
+
+registry: List[Benchmark] = []
+
+
+def benchmark(name: str, params: Sequence[object], seed: int = 0, repeat: int = 5):
+    # Register the decorated factory as a benchmark run once for each param.
+    def decorator(factory: Callable[[object], Callable[[], object]]):
+        registry.append(Benchmark(name, factory, params, seed, repeat))
+        return factory
+    return decorator
+
+
+def run_all(
+    benchmarks: Iterable[Benchmark],
+    repeat: Optional[int] = None,
+    quick: bool = False,
+    report: Optional[Callable[[str, Dict[str, float]], None]] = None,
+) -> Dict[str, object]:
+    """Run benchmarks and return their results, along with enough about the
+    environment to tell whether two result files are comparable. With
+    `quick`, only the smallest param of each benchmark is run.
+    """
+    results = {}
+    for bench in benchmarks:
+        for param in bench.params[:1] if quick else bench.params:
+            result = bench.run(param, repeat)
+            results[bench.key(param)] = result
+            if report:
+                report(bench.key(param), result)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "tcod": tcod.__version__,
+            "machine": platform.machine(),
+            "system": platform.system(),
+        },
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, object], baseline: Dict[str, object], threshold: float = 0.2,
+) -> List[Tuple[str, float, bool]]:
+    """Compare two result files by their fastest samples. Returns
+    (key, current / baseline, regressed) for every benchmark in both, where
+    regressed means slower than the baseline by more than `threshold`.
+    """
+    comparisons = []
+    for key, result in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        ratio = result["min"] / baseline["results"][key]["min"]
+        comparisons.append((key, ratio, ratio > 1 + threshold))
+    return comparisons
+
+
+def load(path: str) -> Dict[str, object]:
+    with open(path) as file:
+        return json.load(file)
+
+
+def dump(results: Dict[str, object], path: str) -> None:
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
@@ -0,0 +1,51 @@
+"""Run the benchmarks, optionally comparing against a stored baseline.
+
+    python -m benchmarks -o baseline.json
+    python -m benchmarks -b baseline.json -o results.json
+
+Exits with status 1 if any benchmark regressed past the threshold.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+
+import benchmarks
+import benchmarks.cases
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Time the game's hot paths.")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("-r", "--repeat", type=int, default=None, help="override each benchmark's repeat count")
+    parser.add_argument("-q", "--quick", action="store_true", help="only run the smallest size of each benchmark")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this path")
+    parser.add_argument("-b", "--baseline", help="compare against results previously written with --output")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2, help="allowed slowdown before failing, as a fraction")
+    args = parser.parse_args()
+
+    selected = [bench for bench in benchmarks.registry if args.filter in bench.name]
+    results = benchmarks.run_all(
+        selected, args.repeat, args.quick,
+        report=lambda key, result: print(f"{key:<28} min {result['min'] * 1000:10.2f}ms  median {result['median'] * 1000:10.2f}ms"),
+    )
+    if args.output:
+        benchmarks.dump(results, args.output)
+
+    if not args.baseline:
+        return 0
+
+    baseline = benchmarks.load(args.baseline)
+    if baseline["environment"] != results["environment"]:
+        print("warning: the baseline was recorded in a different environment", file=sys.stderr)
+
+    regressions = 0
+    print()
+    for key, ratio, regressed in benchmarks.compare(results, baseline, args.threshold):
+        regressions += regressed
+        print(f"{key:<28} {ratio:6.2f}x {'REGRESSED' if regressed else ''}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
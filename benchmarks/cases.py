@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import os
+import random
+import tempfile
+from typing import Callable
+
+import tcod
+
+import actions
+import factories.entity
+import generated_structures
+import procgen
+import setup_game
+from benchmarks import benchmark
+from engine import Engine
+from game_map import GameWorld
+
+
+def new_engine(size: int) -> Engine:
+    # Same as setup_game.new_game, with a configurable map size.
+    engine = Engine(factories.entity.player.spawn())
+    engine.game_world = GameWorld(engine, size, size, pregenerate=False)
+    engine.game_world.generate_floor()
+    engine.update_fov()
+    return engine
+
+
+def populate(engine: Engine, count: int) -> None:
+    # Replace every other actor on the floor with `count` janitors.
+    game_map = engine.game_map
+    for actor in list(game_map.actors):
+        if actor is not engine.player:
+            del actor.game_map
+
+    free = [
+        pos for pos in zip(*game_map.tiles["walkable"].nonzero())
+        if pos not in game_map.entity_index
+    ]
+    spawned = [
+        factories.entity.janitor.spawn((int(x), int(y)), game_map)
+        for x, y in random.sample(free, min(count, len(free)))
+    ]
+    game_map.scheduler.schedule_many(spawned)
+
+
+@benchmark("generate_dungeon", params=(80, 120))
+def generate_dungeon(size: int) -> Callable[[], object]:
+    engine = Engine(factories.entity.player.spawn())
+    return lambda: procgen.generate_dungeon(size, size, engine, 0)
+
+
+@benchmark("Tower", params=(30, 60, 90))
+def tower(size: int) -> Callable[[], object]:
+    return lambda: generated_structures.Tower(0, 0, size, size)
+
+
+@benchmark("MarchingRoom", params=(16, 32, 48))
+def marching_room(size: int) -> Callable[[], object]:
+    return lambda: generated_structures.MarchingRoom(0, 0, size, size)
+
+
+@benchmark("CellularRoom", params=(16, 32, 48), repeat=3)
+def cellular_room(size: int) -> Callable[[], object]:
+    return lambda: generated_structures.CellularRoom(0, 0, size, size)
+
+
+@benchmark("FloodedCellsRoom", params=(16, 32, 48), repeat=3)
+def flooded_cells_room(size: int) -> Callable[[], object]:
+    return lambda: generated_structures.FloodedCellsRoom(0, 0, size, size)
+
+
+@benchmark("handle_enemy_turns", params=(8, 32, 128))
+def handle_enemy_turns(count: int, turns: int = 10) -> Callable[[], object]:
+    engine = new_engine(80)
+    populate(engine, count)
+    player = engine.player
+
+    def run() -> None:
+        for i in range(turns):
+            actions.WaitAction(player).perform()
+            engine.handle_enemy_turns()
+            player.fighter.hp = player.fighter.max_hp  # Keep the player alive.
+    return run
+
+
+@benchmark("update_fov", params=(80, 120))
+def update_fov(size: int, steps: int = 50) -> Callable[[], object]:
+    engine = new_engine(size)
+    game_map = engine.game_map
+    free = [
+        (int(x), int(y)) for x, y in zip(*game_map.tiles["walkable"].nonzero())
+        if (x, y) not in game_map.entity_index
+    ]
+    walk = random.sample(free, min(steps, len(free)))
+
+    def run() -> None:
+        for pos in walk:
+            engine.player.pos = pos
+            engine.update_fov()
+    return run
+
+
+@benchmark("GameMap.render", params=(80, 120))
+def render(size: int, frames: int = 20) -> Callable[[], object]:
+    engine = new_engine(size)
+    console = tcod.console.Console(80, 50, order="F")
+    engine.camera.follow(console)
+
+    def run() -> None:
+        for i in range(frames):
+            engine.game_map.render(console, engine.camera)
+    return run
+
+
+@benchmark("save_load", params=(80, 120), repeat=3)
+def save_load(size: int) -> Callable[[], object]:
+    engine = new_engine(size)
+
+    def run() -> None:
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                engine.save_as()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    setup_game.load_game(pregenerate=False)
+            finally:
+                os.chdir(cwd)
+    return run
@@ -3,8 +3,6 @@ from __future__ import annotations
 from typing import Union, Optional, List, Tuple, TYPE_CHECKING
 
 import numpy as np  # type: ignore
-import tcod
-from tcod.map import compute_fov
 import random
 
 from actions import Action, MeleeAction, MovementAction, WaitAction, BumpAction
@@ -74,21 +72,9 @@ class BaseAI(Action):
 
         If there is no valid path then returns an empty list.
         """
-        # Copy the walkable array.
-        cost = np.array(self.entity.game_map.tiles["walkable"], dtype=np.int8)
-
-        for entity in self.entity.game_map.entities:
-            # Check that an enitiy blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.pos]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                cost[entity.pos] += self.tenacity
-
-        # Create a graph from the cost array and pass that graph to a new pathfinder.
-        graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
-        pathfinder = tcod.path.Pathfinder(graph)
+        # Reuse the map's pathfinder, which already accounts for blocking entities.
+        pathfinder = self.entity.game_map.get_pathfinder(self.tenacity)
+        pathfinder.clear()
 
         pathfinder.add_root(self.entity.pos)  # Start position.
 
@@ -98,13 +84,33 @@ class BaseAI(Action):
         # Convert from List[List[int]] to List[Tuple[int, int]].
         return [(index[0], index[1]) for index in path]
     
+    def step_downhill(self, distance: np.ndarray) -> Optional[Tuple[int, int]]:
+        """Return the adjacent position with the lowest value on a distance map.
+
+        Positions with blocking entities are skipped. Returns None if no
+        neighbor is closer than the current position.
+        """
+        game_map = self.entity.game_map
+        best_pos, best_distance = None, distance[self.entity.pos]
+
+        for delta in calculator.adjacent:
+            pos = calculator.tuple_add(self.entity.pos, delta)
+            if (game_map.in_bounds(pos) and distance[pos] < best_distance
+                    and not game_map.get_blocking_entity_at_location(pos)):
+                best_pos, best_distance = pos, distance[pos]
+
+        return best_pos
+
     def can_see(self, target: Tuple[int, int]) -> bool:
-        return compute_fov(
-            self.engine.game_map.tiles["transparent"],
-            (self.entity.x, self.entity.y),
-            radius=int(self.entity.fighter.view_distance),
-            algorithm=tcod.FOV_SHADOW,
-        )[target]
+        if self.engine.symmetric_fov and target == self.engine.player.pos:
+            return self.engine.is_seen_by(self.entity)
+
+        return self.engine.game_map.is_visible_from(
+            self.entity.pos,
+            int(self.entity.fighter.view_distance),
+            target,
+            self.engine.fov_algorithm,
+        )
 
     def get_random_target(self) -> Tuple[int, int]:
         x, y = self.entity.pos
@@ -153,7 +159,7 @@ class IdleEnemy (BaseAI):
 class MeanderingEnemy (BaseAI):
     def perform(self) -> None:
         if self.can_see(self.engine.player.pos):
-            return HostileEnemy.from_AI(target=self.engine.player)
+            return HostileEnemy.from_AI(self, target=self.engine.player)
         elif self.entity.distance(self.engine.player.pos) < self.entity.fighter.earshot:
             return HostileEnemy.from_AI(self, target=calculator.tuple_add(self.engine.player.pos, (random.randint(-5, 5), random.randint(-5, 5))))
         elif self.target_pos:
@@ -183,11 +189,15 @@ class HostileEnemy (BaseAI):
 
             if distance <= 1:
                 return MeleeAction(self.entity, delta).perform()
-                
-            self.path = self.get_path_to(self.target_pos)
-            
-            if self.path:
-                dest = self.path.pop(0)
+
+            if self.target is self.engine.player:
+                # Follow the distance map shared by everything hunting the player.
+                dest = self.step_downhill(self.engine.player_distance)
+            else:
+                self.path = self.get_path_to(self.target_pos)
+                dest = self.path.pop(0) if self.path else None
+
+            if dest:
                 return MovementAction(self.entity, calculator.tuple_subtract(dest, self.entity.pos)).perform()
         else:
             IdleEnemy.from_AI(self)
@@ -123,7 +123,7 @@ class ConfusionConsumable (Consumable):
         if action.target_actor is action.entity:
             raise Impossible("You cannot target yourself.")
 
-        action.target_actor.ai = components.ai.ConfusedEnemy(entity = action.target_actor, previous_ai = action.target_actor.ai, turns = self.turns)
+        action.target_actor.ai = components.ai.ConfusedEnemy(previous_ai = action.target_actor.ai, turns = self.turns)
         self.consume()
 
 
@@ -149,7 +149,7 @@ class FireballDamageConsumable (Consumable):
             raise Impossible("You cannot target an are that you cannot see.")
         
         targets_hit = False
-        for actor in self.engine.game_map.actors:
+        for actor in list(self.engine.game_map.actors):  # Actors may die, so iterate over a copy.
             if actor.distance(action.target_pos) <= self.radius:
                 self.engine.message_log.add_message(f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!")
                 actor.fighter.take_damage(self.damage)
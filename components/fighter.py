@@ -149,5 +149,6 @@ class Fighter (BaseComponent):
         self.entity.ai = None
         self.entity.name = f"remains of {self.entity.name}"
         self.entity.render_order = RenderOrder.CORPSE
+        self.entity.game_map.bury(self.entity)
 
         self.engine.message_log.add_message(death_message, death_message_color)
@@ -11,6 +11,7 @@ if TYPE_CHECKING:
 
 class Inventory (BaseComponent):
     entity: Entity
+    version: int = 0  # Bumped whenever this inventory, or one inside it, changes.
 
     def __init__(self, initialize: Union[int, List[Item]]) -> None:
         self.items: List[Item] = []
@@ -35,6 +36,16 @@ class Inventory (BaseComponent):
     def delete(self, item: Item) -> None:
         self.items.remove(item)
         del item.parent
+        self.changed()
+
+    def changed(self) -> None:
+        # Bump the version of this inventory and every inventory it's nested
+        # in, so anything cached from their contents gets rebuilt.
+        inventory = self
+        while inventory is not None:
+            inventory.version += 1
+            parent = getattr(getattr(inventory, "entity", None), "parent", None)
+            inventory = parent if isinstance(parent, Inventory) else None
     
     def add(self, item: Item) -> None:
         if len(self.items) < self.capacity:
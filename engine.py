@@ -3,12 +3,12 @@ from __future__ import annotations
 import lzma
 import dill as pickle
 from os import mkdir
-from typing import TYPE_CHECKING
+from typing import Tuple, TYPE_CHECKING
 
+import numpy as np
 import tcod
 from tcod.context import Context
 from tcod.console import Console
-from tcod.map import compute_fov
 
 from actions import MovementAction
 from entity import Actor, Camera
@@ -30,52 +30,88 @@ class Engine:
     def __init__(
         self,
         player: Actor,
+        symmetric_fov: bool = False,
     ) -> None:
         self.mouse_location = (0, 0)
         self.player = player
         self.message_log = MessageLog()
         self.camera = Camera.from_entity(player)
 
+        # With symmetric FOV, anything that can see the player is visible from
+        # the player, so enemy sight checks are read off the player's FOV.
+        self.symmetric_fov = symmetric_fov
+        self._player_sight = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_player_sight"] = None
+        return state
+
     def handle_enemy_turns(self) -> None:
-        current_actor = None
-
-        while True:
-            # Attempt to make the 0 position actor at the next timepoint
-            # array the "current_actor" and give it a turn.
-            try:
-                current_time = min(self.game_map.clock)
-                current_actor = self.game_map.clock[current_time].pop(0)
-
-                # Let "current_actor" have a turn and add it back into the
-                # "time_table".
-                if current_actor.ai:
-                    acting_time = current_actor.ai.acting_time
-                    self.game_map.add_to_clock(current_actor, acting_time)
-                    if current_actor is not self.player:
-                        try:
-                            current_actor.ai.perform()
-                        except exceptions.Impossible:
-                            pass
-
-                # As long as the last actor was not the player,
-                # keep running through turns.
-                if current_actor is self.player:
-                    break
-
-            # If the next timepoint is an empty array, remove it from the
-            # "time_table".
-            except IndexError:
-                self.game_map.clock.pop(min(self.game_map.clock))
-    
+        scheduler = self.game_map.scheduler
+
+        # A dead player has no turn to stop at, so stop as soon as it dies.
+        while scheduler and self.player.is_alive:
+            # Take the actor with the next turn, and add it back into the
+            # scheduler before it acts.
+            current_actor = scheduler.pop()
+            if current_actor.ai:
+                scheduler.schedule(current_actor, current_actor.ai.acting_time)
+
+            # As long as the last actor was not the player,
+            # keep running through turns.
+            if current_actor is self.player:
+                break
+
+            if current_actor.ai:
+                try:
+                    current_actor.ai.perform()
+                except exceptions.Impossible:
+                    pass
+
+    @property
+    def player_distance(self) -> np.ndarray:
+        # Walking distance to the player from every tile of the current floor,
+        # shared by every AI hunting the player. Only recomputed after the
+        # player moves.
+        return self.game_map.get_distance_map(self.player.pos)
+
+    @property
+    def fov_algorithm(self) -> int:
+        return tcod.FOV_SYMMETRIC_SHADOWCAST if self.symmetric_fov else tcod.FOV_SHADOW
+
+    @property
+    def player_sight(self) -> Tuple[Tuple[slice, slice], np.ndarray]:
+        # The player's symmetric FOV, out to the furthest any actor on this
+        # floor can see. Only recomputed once the player or the floor changes.
+        game_map = self.game_map
+        key = game_map, self.player.pos, game_map.tiles_version
+        if self._player_sight is None or self._player_sight[0] != key:
+            radius = max(int(actor.fighter.view_distance) for actor in game_map.actors | {self.player})
+            self._player_sight = key, game_map.compute_fov(self.player.pos, radius, tcod.FOV_SYMMETRIC_SHADOWCAST)
+        return self._player_sight[1]
+
+    def is_seen_by(self, actor: Actor) -> bool:
+        # Whether actor can see the player, using the player's symmetric FOV.
+        # Only meaningful when symmetric_fov is on.
+        (x_window, y_window), sight = self.player_sight
+        x, y = actor.pos
+        dx, dy = x - self.player.x, y - self.player.y
+        radius = int(actor.fighter.view_distance)
+        if radius > 0 and dx * dx + dy * dy >= radius * radius:
+            return False  # Outside of actor's view distance.
+        return (x_window.start <= x < x_window.stop and y_window.start <= y < y_window.stop
+                and bool(sight[x - x_window.start, y - y_window.start]))
+
     def update_fov(self) -> None:
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=self.player.fighter.view_distance,
-            algorithm=tcod.FOV_SHADOW,
-        )
-
-        self.game_map.explored |= self.game_map.visible
+        game_map = self.game_map
+        window, fov = game_map.compute_fov(self.player.pos, int(self.player.fighter.view_distance), self.fov_algorithm)
+
+        # Only the previous and new windows can have changed.
+        game_map.visible[game_map.visible_window] = False
+        game_map.visible[window] = fov
+        game_map.explored[window] |= fov
+        game_map.visible_window = window
     
     def render(self, console: Console) -> None:
         # Render Game Map
@@ -90,3 +126,5 @@ class Engine:
         save_data = lzma.compress(pickle.dumps(self))
         with open("save", "wb") as file:
             file.write(save_data)
+        # Messages spilled out of the log are kept next to the save.
+        self.message_log.save_history("save.history")
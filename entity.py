@@ -60,22 +60,38 @@ class Entity:
     def x(self) -> int:
         return self._x
     @x.setter
-    def d(self, x: int) -> None:
-        self._x = x
+    def x(self, x: int) -> None:
+        self.pos = x, self._y
 
     @property
     def y(self) -> int:
         return self._y
     @y.setter
     def y(self, y: int) -> None:
-        self._y = y
+        self.pos = self._x, y
 
     @property
     def pos(self) -> Tuple[int, int]:
         return self._x, self._y
     @pos.setter
     def pos(self, new_pos) -> None:
-        self._x, self._y = new_pos
+        if self.game_map:
+            # Keep the GameMap's position index up to date.
+            old_pos = self.pos
+            self._x, self._y = new_pos
+            self.game_map.move_entity(self, old_pos)
+        else:
+            self._x, self._y = new_pos
+
+    @property
+    def blocks_movement(self) -> bool:
+        return self._blocks_movement
+    @blocks_movement.setter
+    def blocks_movement(self, blocks_movement: bool) -> None:
+        if self.game_map and blocks_movement != self._blocks_movement:
+            # Keep the GameMap's movement costs up to date.
+            self.game_map.patch_cost(self.pos, 1 if blocks_movement else -1)
+        self._blocks_movement = blocks_movement
 
     @property
     def ancestor(self) -> GameMap:
@@ -101,17 +117,28 @@ class Entity:
                 return self.parent
     @game_map.setter
     def game_map(self, game_map: GameMap) -> None:
+        scheduled = False
         if hasattr(self, "parent"):
             if hasattr(self.parent, "entities"):
-                print("hi1")
-                if hasattr(self, "hardware"): print(len(self.game_map.entities))
-                self.parent.entities.remove(self)
-                if hasattr(self, "hardware"): print(len(self.game_map.entities))
+                if self.parent is not game_map:
+                    # Take any pending turn along to the new GameMap.
+                    scheduled = self.parent.scheduler.cancel(self)
+                self.parent.remove_entity(self)
             elif hasattr(self.parent, "items"):
-                print("hi2")
                 self.parent.items.remove(self)
+                self.parent.changed()
         self.parent = game_map
-        self.parent.entities.add(self)
+        self.parent.add_entity(self)
+        if scheduled:
+            self.parent.scheduler.schedule(self)
+    @game_map.deleter
+    def game_map(self) -> None:
+        # Takes the entity off it's GameMap, along with any pending turn.
+        game_map = self.game_map
+        if game_map is not None:
+            game_map.scheduler.cancel(self)
+            game_map.remove_entity(self)
+            del self.parent
 
     @property
     def container(self) -> Inventory:
@@ -122,11 +149,13 @@ class Entity:
     def container(self, container: Inventory):
         if hasattr(self, "parent"):
             if hasattr(self.parent, "entities"):
-                self.parent.entities.remove(self)
+                self.parent.remove_entity(self)
             elif hasattr(self.parent, "items"):
                 self.parent.items.remove(self)
+                self.parent.changed()
         self.parent = container
         self.parent.items.append(self)
+        self.parent.changed()
 
     @property
     def inventory(self) -> Inventory:
@@ -207,12 +236,21 @@ class Actor (Entity):
         return self._ai
     @ai.setter
     def ai(self, ai: BaseAI) -> None:
+        old_ai = None
         if hasattr(self, "_ai"):
+            old_ai = self._ai
             del self._ai.entity
         self._ai = ai
         if self._ai is not None:
             self._ai.entity = self
 
+        if self.game_map:
+            if self._ai is None:
+                # Actors without an AI don't get turns.
+                self.game_map.scheduler.cancel(self)
+            elif old_ai is not None and old_ai.acting_time != self._ai.acting_time:
+                self.game_map.scheduler.reschedule(self, self._ai.acting_time)
+
     @property
     def is_alive(self) -> bool:
         return bool(self.ai)
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
-from typing import Tuple, Iterable, Iterator, Optional, TYPE_CHECKING
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+import random
+from typing import Dict, List, Set, Tuple, Optional, TYPE_CHECKING
 
 import numpy as np
+import tcod
 from tcod.console import Console
+from tcod.map import compute_fov
 
 from entity import Actor, Item
+from scheduler import Scheduler
 import tile_types
 import calculator
 
@@ -17,6 +24,7 @@ if TYPE_CHECKING:
 class GameMap:
     down_stairs: optional[Tuple[int, int]] = None
     up_stairs: optional[Tuple[int, int]] = None
+    fov_cache_size: int = 128
 
     def __init__(
         self, 
@@ -27,45 +35,221 @@ class GameMap:
         self.engine = engine
         self.width, self.height = width, height
         self.entities = set()
+        # Entities on this map, bucketed by position.
+        self.entity_index: Dict[Tuple[int, int], List[Entity]] = {}
+        # Entities on this map, bucketed by type.
+        self._actors: Set[Actor] = set()
+        self._corpses: Set[Actor] = set()
+        self._items: Set[Item] = set()
 
         self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
+        # Bumped by tiles_changed, so caches can tell when the tiles are stale.
+        self.tiles_version = 0
+        # How many rooms generation laid out on this map.
+        self.room_count = 0
 
-        self.clock = {}
+        self.scheduler = Scheduler()
+
+        # Movement cost grids and their pathfinders, keyed by tenacity.
+        # Built on demand, then patched as blocking entities come and go.
+        self._path_cache: Dict[int, Tuple[np.ndarray, tcod.path.Pathfinder]] = {}
+        # The last distance map computed by get_distance_map, and its root.
+        self._distance_cache: Optional[Tuple[Tuple[int, int], np.ndarray]] = None
+        # Recent compute_fov results, least recently used first.
+        self._fov_cache: OrderedDict[tuple, Tuple[Tuple[slice, slice], np.ndarray]] = OrderedDict()
 
         # To keep track of what the player should see.
         self.visible = np.full((width, height), fill_value=False, order="F")
         self.explored = np.full((width, height), fill_value=False, order="F")
+        # The only part of self.visible that can be True.
+        self.visible_window: Tuple[slice, slice] = slice(0, width), slice(0, height)
         self.fog = fog
 
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_path_cache"] = {}  # Pathfinders can't be pickled.
+        state["_distance_cache"] = None
+        state["_fov_cache"] = OrderedDict()
+        return state
+
+    @property
+    def actors(self) -> Set[Actor]:
+        # Living actors. Don't add or remove entities while iterating over this.
+        return self._actors
+
     @property
-    def actors(self) -> Iterator[Actor]:
-        yield from (entity for entity in self.entities if isinstance(entity, Actor) and entity.is_alive)
+    def corpses(self) -> Set[Actor]:
+        return self._corpses
     
     @property
-    def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+    def items(self) -> Set[Item]:
+        return self._items
 
-    def add_to_clock(self, actor: Actor, time: Optional[float] = None) -> None:
-        try:
-            t = min(self.clock) + time if time is not None else actor.fighter.acting_time
-        except ValueError:
-            t = time if time is not None else actor.fighter.acting_time
+    def add_entity(self, entity: Entity) -> None:
+        # Called by Entity when its parent becomes this GameMap.
+        self.entities.add(entity)
+        self.entity_index.setdefault(entity.pos, []).append(entity)
+        if entity.blocks_movement:
+            self.patch_cost(entity.pos, 1)
+        if isinstance(entity, Actor):
+            if entity.is_alive:
+                self._actors.add(entity)
+            else:
+                self._corpses.add(entity)
+        elif isinstance(entity, Item):
+            self._items.add(entity)
+
+    def remove_entity(self, entity: Entity) -> None:
+        # Called by Entity when it leaves this GameMap.
+        self.entities.remove(entity)
+        self._unindex(entity, entity.pos)
+        if entity.blocks_movement:
+            self.patch_cost(entity.pos, -1)
+        self._actors.discard(entity)
+        self._corpses.discard(entity)
+        self._items.discard(entity)
+
+    def bury(self, actor: Actor) -> None:
+        # Called by Fighter when an actor on this map dies.
+        self._actors.discard(actor)
+        self._corpses.add(actor)
+
+    def move_entity(self, entity: Entity, old_pos: Tuple[int, int]) -> None:
+        # Called by Entity after its position changes.
+        self._unindex(entity, old_pos)
+        self.entity_index.setdefault(entity.pos, []).append(entity)
+        if entity.blocks_movement:
+            self.patch_cost(old_pos, -1)
+            self.patch_cost(entity.pos, 1)
+
+    def _unindex(self, entity: Entity, pos: Tuple[int, int]) -> None:
+        bucket = self.entity_index[pos]
+        bucket.remove(entity)
+        if not bucket:
+            del self.entity_index[pos]
+
+    def patch_cost(self, pos: Tuple[int, int], blockers: int) -> None:
+        # Adjust the cached cost grids for `blockers` blocking entities
+        # arriving at (or leaving, if negative) pos.
+        if self._path_cache and self.tiles["walkable"][pos]:
+            for tenacity, (cost, pathfinder) in self._path_cache.items():
+                cost[pos] += blockers * tenacity
+
+    def tiles_changed(self) -> None:
+        # Must be called after editing self.tiles, so that anything derived
+        # from the tiles gets rebuilt.
+        self.tiles_version += 1
+        self._path_cache = {}
+        self._distance_cache = None
+        self._fov_cache.clear()
+
+    def get_pathfinder(self, tenacity: int) -> tcod.path.Pathfinder:
+        """Return a Pathfinder over this map's movement costs.
+
+        Blocked positions cost `tenacity` extra. A lower number means more
+        enemies will crowd behind each other in hallways. A higher number
+        means enemies will take longer paths in order to surround the player.
+
+        The Pathfinder is shared, so clear it before adding roots.
+        """
+        if tenacity not in self._path_cache:
+            # Copy the walkable array.
+            cost = np.array(self.tiles["walkable"], dtype=np.int8, order="F")
+
+            for pos, entities in self.entity_index.items():
+                if cost[pos]:
+                    cost[pos] += tenacity * sum(entity.blocks_movement for entity in entities)
+
+            # The graph keeps a reference to cost, so later patches to it are
+            # seen by the pathfinder.
+            graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
+            self._path_cache[tenacity] = cost, tcod.path.Pathfinder(graph)
+
+        return self._path_cache[tenacity][1]
+
+    def get_distance_map(self, root: Tuple[int, int]) -> np.ndarray:
+        """Return the walking distance from root to every tile on this map.
+
+        Uses the same step costs as get_pathfinder, but ignores entities.
+        Unreachable tiles hold the maximum int32 value. The last map is
+        cached, so asking again for the same root is free.
+        """
+        if self._distance_cache is None or self._distance_cache[0] != root:
+            distance = tcod.path.maxarray((self.width, self.height), dtype=np.int32, order="F")
+            distance[root] = 0
+            cost = np.array(self.tiles["walkable"], dtype=np.int8, order="F")
+            tcod.path.dijkstra2d(distance, cost, 2, 3, out=distance)
+            self._distance_cache = root, distance
+
+        return self._distance_cache[1]
+
+    def fov_window(self, origin: Tuple[int, int], radius: int) -> Tuple[slice, slice]:
+        # The part of the map within radius of origin. A radius of 0 is
+        # unlimited, so that covers the whole map.
+        if radius <= 0:
+            return slice(0, self.width), slice(0, self.height)
+        x, y = origin
+        return (
+            slice(max(0, x - radius), min(self.width, x + radius + 1)),
+            slice(max(0, y - radius), min(self.height, y + radius + 1)),
+        )
 
+    def compute_fov(
+        self, origin: Tuple[int, int], radius: int, algorithm: int = tcod.FOV_SHADOW,
+    ) -> Tuple[Tuple[slice, slice], np.ndarray]:
+        """Return what can be seen from origin within radius.
+
+        Only the window of the map within radius is computed, so this returns
+        that window along with the field of view inside it. Results are
+        cached per origin, radius, algorithm and tiles_version, so actors
+        standing still don't recompute their field of view. The returned
+        array is shared and read only.
+        """
+        key = origin, radius, algorithm, self.tiles_version
         try:
-            self.clock[t].append(actor)
+            self._fov_cache.move_to_end(key)
+            return self._fov_cache[key]
         except KeyError:
-            self.clock[t] = [actor]
+            pass
+
+        window = self.fov_window(origin, radius)
+        fov = compute_fov(
+            self.tiles["transparent"][window],
+            (origin[0] - window[0].start, origin[1] - window[1].start),
+            radius=radius,
+            algorithm=algorithm,
+        )
+        fov.flags.writeable = False
+
+        self._fov_cache[key] = window, fov
+        if len(self._fov_cache) > self.fov_cache_size:
+            self._fov_cache.popitem(last=False)
+        return window, fov
+
+    def is_visible_from(
+        self, origin: Tuple[int, int], radius: int, target: Tuple[int, int], algorithm: int = tcod.FOV_SHADOW,
+    ) -> bool:
+        (x_window, y_window), fov = self.compute_fov(origin, radius, algorithm)
+        x, y = target
+        return (x_window.start <= x < x_window.stop and y_window.start <= y < y_window.stop
+                and bool(fov[x - x_window.start, y - y_window.start]))
+
+    def get_entities_at_location(self, pos: Tuple[int, int]) -> Tuple[Entity, ...]:
+        return tuple(self.entity_index.get(pos, ()))
+
+    def get_items_at_location(self, pos: Tuple[int, int]) -> List[Item]:
+        return [entity for entity in self.entity_index.get(pos, ()) if isinstance(entity, Item)]
 
     def get_blocking_entity_at_location(self, pos: Tuple[int, int]) -> Optional[Entity]:
-        for entity in self.entities:
-            if entity.blocks_movement and entity.pos == pos:
+        for entity in self.entity_index.get(pos, ()):
+            if entity.blocks_movement:
                 return entity
         return None
 
     def get_actor_at_location(self, pos: Tuple[int, int]):
-        for actor in self.actors:
-            if actor.pos == pos:
-                return actor
+        for entity in self.entity_index.get(pos, ()):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
         return None
 
     def in_bounds(self, pos: Tuple[int, int]) -> bool:
@@ -79,36 +263,41 @@ class GameMap:
         xm_2, ym_2 = min(xm + console.width, self.width), min(ym + console.height, self.height)
         xc_1, yc_1 = max(0, -xm), max(0, -ym)
         xc_2, yc_2 = xc_1 + xm_2 - xm_1, yc_1 + ym_2 - ym_1
+        window = slice(xm_1, xm_2), slice(ym_1, ym_2)
+
+        # Draw straight into the console's buffer, so nothing map sized is
+        # allocated. Remembered tiles use their precomputed dark graphic.
+        out = console.rgb[xc_1:xc_2, yc_1:yc_2]
         if self.fog:
-            console.rgb[xc_1:xc_2, yc_1:yc_2] = np.select(
-                condlist=[self.explored[xm_1:xm_2, ym_1:ym_2]],
-                choicelist=[self.tiles["graphic"][xm_1:xm_2, ym_1:ym_2]],
-                default=tile_types.SHROUD
-            )
-            console.rgb["fg"] = console.rgb["fg"] // 1.4
-            console.rgb["bg"] = console.rgb["bg"] // 1.4
-            console.rgb[xc_1:xc_2, yc_1:yc_2] = np.select(
-                condlist=[self.visible[xm_1:xm_2, ym_1:ym_2]],
-                choicelist=[self.tiles["graphic"][xm_1:xm_2, ym_1:ym_2]],
-                default=console.rgb[xc_1:xc_2, yc_1:yc_2]
-            )
+            out[...] = tile_types.SHROUD
+            np.copyto(out, self.tiles["dark"][window], where=self.explored[window])
         else:
-            console.rgb[xc_1:xc_2, yc_1:yc_2] = self.tiles["graphic"][xm_1:xm_2, ym_1:ym_2]
-            console.rgb["fg"] = console.rgb["fg"] // 1.4
-            console.rgb["bg"] = console.rgb["bg"] // 1.4
-            console.rgb[xc_1:xc_2, yc_1:yc_2] = np.select(
-                condlist=[self.visible[xm_1:xm_2, ym_1:ym_2]],
-                choicelist=[self.tiles["graphic"][xm_1:xm_2, ym_1:ym_2]],
-                default=console.rgb[xc_1:xc_2, yc_1:yc_2]
-            )
+            out[...] = self.tiles["dark"][window]
+        np.copyto(out, self.tiles["graphic"][window], where=self.visible[window])
+
+        # Only entities in the FOV are drawn, so only look up the visible tiles
+        # which are both on screen and inside the last FOV window.
+        x_window, y_window = self.visible_window
+        x1, y1 = max(xm_1, x_window.start), max(ym_1, y_window.start)
+        x2, y2 = min(xm_2, x_window.stop), min(ym_2, y_window.stop)
+        if x1 >= x2 or y1 >= y2:
+            return
 
-        entities_sorted_for_rendering = sorted(self.entities, key = lambda x: x.render_order.value)
+        xs, ys, chars, colors = [], [], [], []
+        visible_x, visible_y = self.visible[x1:x2, y1:y2].nonzero()
+        for x, y in zip((visible_x + x1).tolist(), (visible_y + y1).tolist()):
+            entities = self.entity_index.get((x, y))
+            if entities:
+                # The entity with the highest render order is drawn on top.
+                entity = max(entities, key=lambda entity: entity.render_order.value)
+                xs.append(x - xm)
+                ys.append(y - ym)
+                chars.append(ord(entity.char))
+                colors.append(entity.color)
 
-        for entity in entities_sorted_for_rendering:
-            # Only print entities that are in the FOV
-            if self.visible[entity.pos]:
-                x, y = camera.game_map_to_console(entity.pos, console)
-                console.print(x, y, string=entity.char, fg=entity.color)
+        if xs:
+            console.rgb["ch"][xs, ys] = chars
+            console.rgb["fg"][xs, ys] = colors
 
 
 class GameWorld:
@@ -117,6 +306,7 @@ class GameWorld:
         engine: Engine,
         map_height: int, map_width: int,
         fog: bool = True,
+        pregenerate: bool = False,
     ) -> None:
         self.engine = engine
 
@@ -126,12 +316,91 @@ class GameWorld:
         self.game_maps = []
         self.current_floor_num = 0
 
+        # The floor below the deepest one is generated from a seed picked in
+        # advance, in a worker process while pregenerate is on.
+        self.pregenerate = pregenerate
+        self._next_floor: Optional[Tuple[int, int, Optional[Future]]] = None  # (floor_num, seed, future)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __getstate__(self) -> dict:
+        # Worker processes can't be pickled, so leave them out of the copy.
+        # They keep running here; shutdown is what stops them.
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        if self._next_floor:
+            state["_next_floor"] = self._next_floor[:2] + (None,)
+        return state
+
     @property
     def current_floor(self):
         return self.game_maps[self.current_floor_num]
 
     def generate_floor(self) -> None:
-        from procgen import generate_dungeon
+        from procgen import generate_dungeon, generate_manifest, load_manifest
+
+        floor_num = len(self.game_maps)
+        if floor_num == 0:
+            game_map = generate_dungeon(self.map_width, self.map_height, self.engine, floor_num)
+        else:
+            seed, manifest = self.take_next_floor(floor_num)
+            if manifest is None:
+                # The worker isn't done yet, so don't wait on it.
+                manifest = generate_manifest(self.map_width, self.map_height, floor_num, seed)
+            game_map = load_manifest(manifest, self.engine)
+
+        game_map.fog = self.fog
+        self.game_maps.append(game_map)
+
+    def take_next_floor(self, floor_num: int) -> Tuple[int, Optional[bytes]]:
+        # Returns the seed for floor_num, and its manifest if a worker
+        # already finished generating it.
+        if not self._next_floor or self._next_floor[0] != floor_num:
+            return random.getrandbits(32), None
+
+        _, seed, future = self._next_floor
+        self._next_floor = None
+        if future is None:
+            return seed, None
+        if not future.done():
+            future.cancel()
+            return seed, None
+        try:
+            return seed, future.result()
+        except Exception:
+            return seed, None  # Generate it here instead, and raise any error from there.
+
+    def prepare_next_floor(self) -> None:
+        # Once the player is on the deepest floor, pick the seed for the next
+        # one and start generating it in the background.
+        from procgen import generate_manifest
+
+        floor_num = len(self.game_maps)
+        if self.current_floor_num != floor_num - 1:
+            return
+        if self._next_floor and self._next_floor[0] == floor_num:
+            if self._next_floor[2] is not None or not self.pregenerate:
+                return
+            seed = self._next_floor[1]  # Restarting after a load.
+        else:
+            seed = random.getrandbits(32)
+
+        future = None
+        if self.pregenerate:
+            try:
+                if self._executor is None:
+                    # Spawned rather than forked, so workers don't inherit the window.
+                    self._executor = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"))
+                future = self._executor.submit(generate_manifest, self.map_width, self.map_height, floor_num, seed)
+            except (OSError, RuntimeError, NotImplementedError):
+                self.pregenerate = False  # No worker processes here, so generate floors when reached.
+        self._next_floor = floor_num, seed, future
 
-        self.game_maps.append(generate_dungeon(self.map_width, self.map_height, self.engine, len(self.game_maps)))
-        self.game_maps[-1].fog = self.fog
+    def shutdown(self) -> None:
+        # Stops the worker process, if there is one. The next floor's seed is
+        # kept, so prepare_next_floor can start generating it again.
+        if self._next_floor and self._next_floor[2] is not None:
+            self._next_floor[2].cancel()
+            self._next_floor = self._next_floor[:2] + (None,)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-from typing import Tuple, Callable, Iterator, Iterable
+from typing import Tuple, Iterator, Optional
 
+import heapq
 import numpy as np
 import random
 
@@ -158,32 +159,51 @@ class MarchingRoom (Room):
         x: int, y: int, 
         width: int, height: int, 
         palette=(tile_types.wall, tile_types.floor),
-        dist: int = None, rotate: float = 0.3, 
+        dist: int = None, rotate: float = 0.3, walkers: int = 1,
     ) -> None:
         super().__init__(x, y, width, height, palette)
         if dist is None: dist = int(self.width * self.height * 0.8)
-        self.generate(dist=dist, rotate=rotate)
+        self.generate(dist=dist, rotate=rotate, walkers=walkers)
     
-    def generate(self, dist: int = None, rotate: float = 0.3) -> None:
+    def generate(self, dist: int = None, rotate: float = 0.3, walkers: int = 1) -> None:
+        # Walkers start in the middle facing a random way, and share dist steps
+        # between them. After each step a walker turns left or right with a
+        # chance of rotate, and it bounces off the edges of the room. Every
+        # cell a walker steps from is carved out.
         if dist is None: dist = int(self.width * self.height * 0.8)
-        x_pos, y_pos, dir = int(self.width / 2), int(self.height / 2), random.randint(0, 3)
-        i = 0
-        while i < dist:
-            if 0 <= x_pos + self._cardinals[dir][0] < self.width and 0 <= y_pos + self._cardinals[dir][1] < self.height:
-                self.tiles[x_pos, y_pos] = self.palette[1]
-                x_pos, y_pos = x_pos + self._cardinals[dir][0], y_pos + self._cardinals[dir][1]
-                i += 1
-            else:
-                dir += random.choice([-1, 1])
-                if dir > 3: dir = 0
-                if dir < 0: dir = 3
-
-            if random.random() < rotate:
-                dir += random.choice([-1, 1])
-                if dir > 3: dir = 0
-                if dir < 0: dir = 3
+        budget = np.full(walkers, dist // walkers)
+        budget[:dist % walkers] += 1
+        # Positions are tracked unbounded, and folded back into the room, which
+        # is the same as reflecting off it's walls.
+        pos = np.empty((walkers, 2), dtype=int)
+        pos[:] = int(self.width / 2), int(self.height / 2)
+        dirs = np.random.randint(0, 4, walkers)
+
+        cardinals = np.array(self._cardinals)
+        size = np.array((self.width, self.height))
+        carved = np.zeros((self.width, self.height), dtype=bool)
+
+        # Steps are simulated a chunk at a time, to bound the memory used.
+        chunk = 1024
+        for start in range(0, int(budget.max()), chunk):
+            steps = min(chunk, int(budget.max()) - start)
+            # One draw per step decides both whether and which way to turn.
+            draws = np.random.random((walkers, steps))
+            turns = (draws < rotate).astype(int) - 2 * (draws < rotate / 2)
+            turned = dirs[:, None] + np.cumsum(turns, axis=1)  # Facing after each step.
+            facing = (turned - turns) % 4  # Facing for each step.
+            path = pos[:, None] + np.cumsum(cardinals[facing], axis=1)  # Position after each step.
+
+            taken = np.arange(steps) < (budget - start)[:, None]
+            departed = np.concatenate((pos[:, None], path[:, :-1]), axis=1)[taken]
+            folded = departed % (2 * size)
+            folded = np.where(folded < size, folded, 2 * size - 1 - folded)
+            carved[folded[:, 0], folded[:, 1]] = True
+
+            pos, dirs = path[:, -1], turned[:, -1] % 4
+
+        self.tiles[carved] = self.palette[1]
 
-# There's an issue here, smooth_raw has an index error.
 class CellularRoom (Room):
     def __init__(
         self, 
@@ -198,32 +218,29 @@ class CellularRoom (Room):
     def fill_raw(self) -> np.array:
         self.tiles_raw =  np.random.rand(self.width, self.height)
 
+    @staticmethod
+    def _shifted(offset: int, size: int) -> Tuple[slice, slice]:
+        # Slices pairing each cell along an axis with the cell `offset` away,
+        # for the cells where that neighbour is inside the room.
+        return slice(max(0, -offset), min(size, size - offset)), slice(max(0, offset), min(size, size + offset))
+
     def smooth_raw(self, smoothing_area: str = "r") -> None:
-        new_tiles_raw = np.copy(self.tiles_raw)
-
-        for y, row in enumerate(self.tiles_raw):
-            for x, data in enumerate(row):
-                total, considered = 0, 0
-                considered_x, considered_y = 0, 0
-
-                for point in self._smoothing_areas[smoothing_area]:
-                    considered_x, considered_y = x + point[0], y + point[1]
-                    try:
-                        total += self.tiles_raw[considered_x, considered_y]
-                        considered += 1
-                    except IndexError:
-                        pass
-            
-                # Whenever width != height, IndexError: index is out of bounds for axis with size 30. 
-                # Seems to flatten the array?
-                new_tiles_raw[x, y] = total / considered
-        
-        self.tiles_raw = new_tiles_raw 
+        # Replace each cell with the mean of its neighbours in the smoothing
+        # area, only counting neighbours inside the room.
+        total = np.zeros_like(self.tiles_raw)
+        considered = np.zeros(self.tiles_raw.shape, dtype=np.int32)
 
-    def from_raw(self, f: Callable[[float], Tuple[int, Tuple[int, int, int], Tuple[int, int, int]]]):
-        for y, row in enumerate(self.tiles_raw):
-            for x, data in enumerate(row):
-                self.tiles[x, y] = f(data)
+        for dx, dy in self._smoothing_areas[smoothing_area]:
+            x_dest, x_src = self._shifted(dx, self.width)
+            y_dest, y_src = self._shifted(dy, self.height)
+            total[x_dest, y_dest] += self.tiles_raw[x_src, y_src]
+            considered[x_dest, y_dest] += 1
+
+        self.tiles_raw = np.divide(total, considered, out=self.tiles_raw.copy(), where=considered > 0)
+
+    def from_mask(self, mask: np.ndarray) -> None:
+        # Floor where mask is set, wall everywhere else.
+        self.tiles[...] = np.where(mask, self.palette[1], self.palette[0])
 
     def generate(
         self, 
@@ -234,15 +251,12 @@ class CellularRoom (Room):
         for i in range(smoothing):
             self.smooth_raw(smoothing_area)
 
-        self.from_raw(lambda x: self.palette[1] if x < np.sort(self.tiles_raw, axis=None)[int(self.width * self.height * threshold)] else self.palette[0])
+        # The lowest `threshold` of cells become floor.
+        k = min(int(self.tiles_raw.size * threshold), self.tiles_raw.size - 1)
+        cutoff = np.partition(self.tiles_raw, k, axis=None)[k]
+        self.from_mask(self.tiles_raw < cutoff)
 
 class FloodedCellsRoom (CellularRoom):
-    @staticmethod
-    def find_nearest(array, value):
-        array = np.asarray(array)
-        idx = (np.abs(array - value)).argmin()
-        return array[idx]
-
     def __init__(
         self, 
         x: int, y: int, width: int, height: int, 
@@ -267,24 +281,31 @@ class FloodedCellsRoom (CellularRoom):
         for i in range(smoothing):
             self.smooth_raw(smoothing_area)
         
-        start_value = self.tiles_raw[start[0], start[1]]
-        SortedQueue = {start_value: start}  # A dictionary to hold all key sortable relative to their value
+        # Flood outwards from start, always filling the frontier cell whose
+        # value is closest to the start's. Ties go to the lowest position.
+        # Plain lists are read much faster than arrays one cell at a time.
+        distance = np.abs(self.tiles_raw - self.tiles_raw[start[0], start[1]]).tolist()
+        flooded = np.zeros(self.tiles_raw.shape, dtype=bool)
+        queued = np.zeros(self.tiles_raw.shape, dtype=bool).tolist()
+        queued[start[0]][start[1]] = True
+        frontier = [(0.0, start[0], start[1])]
 
         for i in range(int(self.width * self.height * threshold)):
-            considered_value = self.find_nearest([k for k, v in SortedQueue.items()], start_value)
-            considered_loc = (SortedQueue[considered_value][0], SortedQueue[considered_value][1])
-            SortedQueue.pop(considered_value)
+            if not frontier:
+                break
+            _, x, y = heapq.heappop(frontier)
+            flooded[x, y] = True
 
-            self.tiles_raw[considered_loc[0], considered_loc[1]] = 2
+            for dx, dy in self._smoothing_areas[nearest_smoothing_area]:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < self.width and 0 <= ny < self.height and not queued[nx][ny]:
+                    queued[nx][ny] = True
+                    heapq.heappush(frontier, (distance[nx][ny], nx, ny))
 
-            for offset in self._smoothing_areas[nearest_smoothing_area]:
-                offset_loc = (offset[0] + considered_loc[0], offset[1] + considered_loc[1])
-                if 0 <= offset_loc[0] < self.width and 0 <= offset_loc[1] < self.height:
-                    SortedQueue[self.tiles_raw[offset_loc[0], offset_loc[1]]] = offset_loc
-        
-        self.from_raw(lambda x: self.palette[1] if x == 2 else self.palette[0])
+        self.from_mask(flooded)
 
-# Implements binary space partitioning, using recursive generation
+# Implements binary space partitioning. The tree is walked with an explicit
+# stack, and every room and tunnel is written straight into one buffer.
 class Tower (Room):
     def __init__(
         self,
@@ -293,84 +314,80 @@ class Tower (Room):
         palette = (tile_types.wall, tile_types.floor),
         req_size: int = 7, split_chance: float = 1.0, split_chance_reduction: float = 0.08,
         room_options = [RectangularRoom, RectangularRoom, MarchingRoom],
+        out: Optional[np.ndarray] = None,
     ) -> None:
+        # out is an optional destination covering this Tower's bounds, such as
+        # GameMap.tiles, generated into in place instead of a new array.
+        self.out = out
         super().__init__(x, y, width, height, palette)
         self.req_size, self.split_chance, self.split_chance_reduction = req_size, split_chance, split_chance_reduction
         self.room_options = room_options
-        self.features = []
+        self.features = []  # The rooms generated at the leaves.
+        self.leaves = np.empty((0, 4), dtype=int)  # The leaves' x1, y1, x2, y2.
         self.generate()
 
-    def generate(self) -> None:
-        # Create BSP Tree
-        if random.random() < self.split_chance: # Only BSP if chance permits
-            if self.width > self.req_size and self.height > self.req_size:
-                if random.random() < .5:  # Horizontal Division
-                    w = random.randint(int(self.width*0.25), int(self.width*0.75))
-                    left = Tower(
-                        self.x1, self.y1, w, self.height, 
-                        split_chance=self.split_chance - self.split_chance_reduction, 
-                        split_chance_reduction=self.split_chance_reduction
-                    )
-                    right = Tower(
-                        self.x1 + w + 1, self.y1, self.width - w - 1, self.height, 
-                        split_chance=self.split_chance - self.split_chance_reduction, 
-                        split_chance_reduction=self.split_chance_reduction
-                    )
-                    self.features = [left, right]
-                else:  # Vertical Division
-                    h = random.randint(int(self.height*0.25), int(self.height*0.75))
-                    top = Tower(
-                        self.x1, self.y1, self.width, h, 
-                        split_chance=self.split_chance - self.split_chance_reduction, 
-                        split_chance_reduction=self.split_chance_reduction
-                    )
-                    bottom = Tower(
-                        self.x1, self.y1 + h + 1, self.width, self.height - h - 1, 
-                        split_chance=self.split_chance - self.split_chance_reduction, 
-                        split_chance_reduction=self.split_chance_reduction
-                    )
-                    self.features = [top, bottom]
-            elif self.width > self.req_size:
-                w = random.randint(int(self.width*0.25), int(self.width*0.75))
-                left = Tower(
-                    self.x1, self.y1, w, self.height, 
-                    split_chance=self.split_chance - self.split_chance_reduction, 
-                    split_chance_reduction=self.split_chance_reduction
-                )
-                right = Tower(
-                    self.x1 + w + 1, self.y1, self.width - w - 1, self.height, 
-                    split_chance=self.split_chance - self.split_chance_reduction, 
-                    split_chance_reduction=self.split_chance_reduction
-                )
-                self.features = [left, right]
-            elif self.height > self.req_size:
-                h = random.randint(int(self.height*0.25), int(self.height*0.75))
-                top = Tower(
-                    self.x1, self.y1, self.width, h, 
-                    split_chance=self.split_chance - self.split_chance_reduction, 
-                    split_chance_reduction=self.split_chance_reduction
-                )
-                bottom = Tower(
-                    self.x1, self.y1 + h + 1, self.width, self.height - h - 1, 
-                    split_chance=self.split_chance - self.split_chance_reduction, 
-                    split_chance_reduction=self.split_chance_reduction
-                )
-                self.features = [top, bottom]
-
-        # Flatten out the BSP Tree
-        if len(self.features):
-            new_features, centers = [], []
-            for feature in self.features:
-                centers.append(feature.center)
-                self.tiles[feature.local_bounds(self.x1, self.y1)] = feature.tiles
-                new_features += feature.features
-            self.features = new_features
-            for x, y in self.tunnel_between(centers[0], centers[1]):
-                self.tiles[x - self.x1, y - self.y1] = self.palette[1]
+    def clear(self) -> None:
+        if self.out is None:
+            super().clear()
         else:
-            # Pick a random room type
-            roomType = random.choice(self.room_options)
-            # Generate the room and add it to features
-            self.features = [roomType(self.x1, self.y1, self.width, self.height, self.palette)]
-            # Make this Tower's tiles the same as the feature just generated.
-            self.tiles = self.features[0].tiles
+            self.tiles = self.out[self.bounds]
+            self.tiles[...] = self.palette[0]
+
+    def generate(self) -> None:
+        # Nodes are visited depth first, drawing random numbers in the same
+        # order a recursive BSP would. Rooms are written as leaves are reached,
+        # and each split's tunnel once both it's halves are done.
+        leaves = []
+        stack = [(False, (self.x1, self.y1, self.width, self.height, self.split_chance))]
+        while stack:
+            joining, node = stack.pop()
+            if joining:
+                for x, y in self.tunnel_between(*node):
+                    self.tiles[x - self.x1, y - self.y1] = self.palette[1]
+                continue
+
+            halves = self.split(*node)
+            if halves:
+                first, second = halves
+                stack.append((True, (self.node_center(first), self.node_center(second))))
+                stack.append((False, second))
+                stack.append((False, first))
+            else:
+                x, y, width, height = node[:4]
+                # Pick a random room type
+                roomType = random.choice(self.room_options)
+                room = roomType(x, y, width, height, self.palette)
+                self.tiles[room.local_bounds(self.x1, self.y1)] = room.tiles
+                self.features.append(room)
+                leaves.append((x, y, x + width, y + height))
+
+        self.leaves = np.array(leaves, dtype=int).reshape(-1, 4)
+
+    def split(
+        self, x: int, y: int, width: int, height: int, split_chance: float,
+    ) -> Optional[Tuple[Tuple[int, int, int, int, float], ...]]:
+        # The two halves of a node, or None if it becomes a room.
+        chance = split_chance - self.split_chance_reduction
+        if random.random() < split_chance: # Only BSP if chance permits
+            if width > self.req_size and height > self.req_size:
+                horizontal = random.random() < .5
+            elif width > self.req_size:
+                horizontal = True
+            elif height > self.req_size:
+                horizontal = False
+            else:
+                return None
+
+            if horizontal:
+                w = random.randint(int(width*0.25), int(width*0.75))
+                return (x, y, w, height, chance), (x + w + 1, y, width - w - 1, height, chance)
+            else:
+                h = random.randint(int(height*0.25), int(height*0.75))
+                return (x, y, width, h, chance), (x, y + h + 1, width, height - h - 1, chance)
+        return None
+
+    @staticmethod
+    def node_center(node: Tuple[int, int, int, int, float]) -> Tuple[int, int]:
+        # Same as Room.center, for a node that hasn't been made a room.
+        x, y, width, height = node[:4]
+        return int((x + x + width) / 2), int((y + y + height) / 2)
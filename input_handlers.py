@@ -13,6 +13,7 @@ import color
 import exceptions
 import render_functions
 import entity
+from tile_types import SHROUD
 
 if TYPE_CHECKING:
     from engine import Engine
@@ -23,16 +24,40 @@ ActionOrHandler = Union[actions.Action, "BaseEventHandler"]
 
 
 class BaseEventHandler (tcod.event.EventDispatch[actions.Action]):
+    dirty: bool = True  # Whether the screen needs to be redrawn for this handler.
+    backdrop: Optional[Console] = None  # What's drawn underneath this handler, once captured.
+
     def handle_events(self, event: tcod.event.Event) -> BaseEventHandler:
+        self.mark_dirty(event)
         state = self.dispatch(event)
         if isinstance(state, BaseEventHandler):
             return state
         assert not isinstance(state, actions.Action), f"{self!r} cannot handle actions."
         return self
     
+    def mark_dirty(self, event: tcod.event.Event) -> None:
+        # Anything but mouse motion might change what's shown. Mouse motion
+        # marks the handler dirty itself, when it matters.
+        if not isinstance(event, tcod.event.MouseMotion):
+            self.dirty = True
+
     def on_render(self, console: Console) -> None:
         raise NotImplementedError()
 
+    def draw_backdrop(self, console: Console, render: Callable[[Console], None], dim: int = 1) -> None:
+        # Draws what render would draw onto console. The game is paused while
+        # this handler is open, so render is only called the first time, into
+        # an off-screen console which is dimmed once and reused afterwards.
+        backdrop = self.backdrop
+        if backdrop is None or (backdrop.width, backdrop.height) != (console.width, console.height):
+            backdrop = self.backdrop = Console(console.width, console.height, order="F")
+            backdrop.clear(SHROUD["ch"], SHROUD["fg"], SHROUD["bg"])
+            render(backdrop)
+            if dim > 1:
+                backdrop.rgb["fg"] //= dim
+                backdrop.rgb["bg"] //= dim
+        backdrop.blit(console)
+
     def ev_quit(self, event: tcod.event.Quit()) -> Optional[actions.Action]:
         raise SystemExit()
 
@@ -42,6 +67,7 @@ class EventHandler (BaseEventHandler):
         self.engine = engine
 
     def handle_events(self, event: tcod.event.Event) -> BaseEventHandler:
+        self.mark_dirty(event)
         action_or_state = self.dispatch(event)
         if isinstance(action_or_state, BaseEventHandler):
             return action_or_state
@@ -71,8 +97,9 @@ class EventHandler (BaseEventHandler):
         return True
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
-        if self.engine.game_map.in_bounds(event.tile):
+        if self.engine.game_map.in_bounds(event.tile) and event.tile != self.engine.mouse_location:
             self.engine.mouse_location = event.tile
+            self.dirty = True  # Only redraw once the mouse is over a new tile.
     
     def on_render(self, console: Console) -> None:
         self.engine.camera.follow(console)  # Update the camera's position
@@ -111,9 +138,9 @@ class Menu (EventHandler):
 
     def on_render(self, console: Console):
         if self.previous:
-            self.previous.on_render(console)
+            self.draw_backdrop(console, self.previous.on_render)
         else:
-            MainGameEventHandler.on_render(self, console)
+            self.draw_backdrop(console, lambda backdrop: MainGameEventHandler.on_render(self, backdrop))
 
     def on_exit(self) -> Optional[ActionOrHandler]:
         """Called when the user is trying to exit or cancel an action.
@@ -156,20 +183,26 @@ class GameOverEventHandler (EventHandler):
 class HistoryViewer (Menu):
     def __init__(self, engine: Engine):
         super().__init__(engine)
-        self.log_length = len(self.engine.message_log.messages)
+        self.history = self.engine.message_log.history()
+        self.log_length = len(self.history)
         self.cursor = self.log_length - 1
+        self.log_console: Optional[Console] = None
     
     def on_render(self, console: Console) -> None:
         super().on_render(console)
 
-        log_console = Console(console.width - 6, console.height - 6)
+        # Reuse the same console between frames, unless the screen resized.
+        log_console = self.log_console
+        if log_console is None or (log_console.width, log_console.height) != (console.width - 6, console.height - 6):
+            log_console = self.log_console = Console(console.width - 6, console.height - 6)
+        log_console.clear()
 
         log_console.draw_frame(0, 0, log_console.width, log_console.height)
         log_console.print_box(0, 0, log_console.width, 1, "┤Message history├", alignment=tcod.CENTER)
 
         self.engine.message_log.render_messages(
             log_console, 1, 1, log_console.width - 2, log_console.height - 2, 
-            self.engine.message_log.messages[: self.cursor + 1],
+            self.history[: self.cursor + 1],
         )
         log_console.blit(console, 3, 3)
     
@@ -436,9 +469,7 @@ class PopupMessage (BaseEventHandler):
         self.text = text
 
     def on_render(self, console: Console) -> None:
-        self.previous.on_render(console)
-        console.tiles["fg"] //= 8
-        console.tiles["bg"] //= 8
+        self.draw_backdrop(console, self.previous.on_render, dim=8)
 
         console.print(
             console.width // 2,
@@ -16,6 +16,10 @@ class InventoryWindow:
     cursor = 0
     title = "Inventory"
 
+    # Listings are rebuilt only once listings_key changes.
+    _listings: Optional[List[Tuple[str, Optional[Item]]]] = None
+    _listings_key: Optional[Tuple[int, ...]] = None
+
     def __init__(self, inventory: Inventory) -> None:
         self.inventory = inventory
 
@@ -51,7 +55,17 @@ class InventoryWindow:
         return self.selected_listing[1]
 
     @property
-    def listings(self) -> Iterable[Tuple[str, Item]]:
+    def listings(self) -> List[Tuple[str, Optional[Item]]]:
+        key = self.listings_key()
+        if self._listings is None or key != self._listings_key:
+            self._listings, self._listings_key = self.build_listings(), key
+        return self._listings
+
+    def listings_key(self) -> Tuple[int, ...]:
+        # The versions of the inventories listed.
+        return (self.inventory.version,)
+
+    def build_listings(self) -> List[Tuple[str, Optional[Item]]]:
         listings = []
         for item in self.inventory.items:
             listings.extend(self._format_listing(item))
@@ -113,18 +127,20 @@ class SoftwareWindow (InventoryWindow):
         self.passive = passive
         self.storage = storage
     
-    @property
-    def listings(self) -> Iterable[Tuple[str, Optional[Item]]]:
+    def listings_key(self) -> Tuple[int, ...]:
+        return self.active.version, self.passive.version, self.storage.version
+
+    def build_listings(self) -> List[Tuple[str, Optional[Item]]]:
         listings = []
         listings.append((self.active.name, None))
         for script in self.active.items:
-            listings.append(script.name, script)
+            listings.append((script.name, script))
         listings.append((self.passive.name, None))
         for script in self.passive.items:
-            listings.append(script.name, script)
+            listings.append((script.name, script))
         listings.append((self.storage.name, None))
         for script in self.storage.items:
-            listings.append(script.name, script)
+            listings.append((script.name, script))
         return listings
 
 
@@ -210,8 +226,7 @@ class HardwareWindow (InventoryWindow):
     def selected_item(self) -> Item:
         return self.selected_listing[1]
 
-    @property
-    def listings(self) -> Iterable[Tuple[str, Item]]:
+    def build_listings(self) -> List[Tuple[str, Optional[Item]]]:
         listings = []
         for item in self.inventory.items:
             if len(item.inventory.items):  # List the item in the slot.
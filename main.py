@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import os
 import traceback
 
 import tcod
@@ -6,12 +7,14 @@ import tcod
 import color
 import exceptions
 import input_handlers
+import profiling
 from tile_types import SHROUD
 import setup_game
 
 
 def save_game(handler: input_handlers.BaseEventHandler) -> None:
     if isinstance(handler, input_handlers.EventHandler):
+        handler.engine.game_world.shutdown()
         handler.engine.save_as()
         print("Game Saved.")
 
@@ -23,7 +26,13 @@ def main() -> None:
         "Md_curses_16x16.png", 16, 16, tcod.tileset.CHARMAP_CP437
     )
 
-    handler: input_handlers.BaseEventHandler = setup_game.MainMenu()
+    # Set SCRIPTED_PROFILE to a path prefix to profile the hot paths, turn by
+    # turn, and write the results there on exit.
+    profile = os.environ.get("SCRIPTED_PROFILE")
+    if profile:
+        profiling.install().mark_turns(input_handlers.EventHandler, "handle_action")
+
+    handler: input_handlers.BaseEventHandler = setup_game.MainMenu(pregenerate=True)
 
     with tcod.context.new_terminal(
         screen_width,
@@ -35,20 +44,34 @@ def main() -> None:
         root_console = tcod.Console(screen_width, screen_height, order="F")
         try:
             while True:
-                root_console.clear(SHROUD["ch"], SHROUD["fg"], SHROUD["bg"])
-                handler.on_render(root_console)
-                context.present(root_console)
+                # Only redraw once something on screen could have changed.
+                if handler.dirty:
+                    root_console.clear(SHROUD["ch"], SHROUD["fg"], SHROUD["bg"])
+                    handler.on_render(root_console)
+                    context.present(root_console)
+                    handler.dirty = False
                 
                 try:
                     for event in tcod.event.wait():
                         context.convert_event(event)
-                        handler = handler.handle_events(event)
+                        next_handler = handler.handle_events(event)
+                        if next_handler is not handler:
+                            # Handlers can be returned to, so may have gone stale.
+                            next_handler.dirty = True
+                        handler = next_handler
                 except Exception:
                     traceback.print_exc()  # Print to stderr.
                     handler.engine.message_log.add_message(traceback.format_exc(), color.error)  # Print to message log.
+                    handler.dirty = True
         except SystemExit or BaseException:
             if handler.engine.player.is_alive:
                 save_game(handler)
+        finally:
+            if isinstance(handler, input_handlers.EventHandler):
+                handler.engine.game_world.shutdown()
+            if profile:
+                profiling.profiler.write_all(profile)
+                profiling.uninstall()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,10 @@
-from typing import Iterable, List, Reversible, Tuple
+from array import array
+from collections import deque
+from typing import BinaryIO, Deque, Dict, Iterable, Iterator, List, Optional, Reversible, Tuple
+import io
+import json
+import shutil
+import tempfile
 import textwrap
 
 from tcod import Console
@@ -7,36 +13,101 @@ import color
 
 
 class Message:
-    def __init__(self, text:str, fg: Tuple[int, int, int] = color.gray_85) -> None:
+    def __init__(self, text:str, fg: Tuple[int, int, int] = color.gray_85, count: int = 1) -> None:
         self.plain_text = text
         self.fg = fg
-        self.count = 1
-    
+        self.count = count
+        self._wrapped: Dict[int, Tuple[int, List[str]]] = {}  # width: (count, lines)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_wrapped"] = {}
+        return state
+
     @property
     def full_text(self) -> str:
         if self.count > 1:
             return f"{self.plain_text} (x{self.count})"
         return self.plain_text
 
+    def wrapped(self, width: int) -> List[str]:
+        # full_text wrapped to width. Cached until the message stacks again.
+        count, lines = self._wrapped.get(width, (None, None))
+        if count != self.count:
+            lines = list(MessageLog.wrap(self.full_text, width))
+            self._wrapped[width] = self.count, lines
+        return lines
+
 
 class MessageLog:
-    def __init__(self) -> None:
-        self.messages: List[Message] = []
-    
+    def __init__(self, capacity: int = 256) -> None:
+        # Only the newest `capacity` messages are kept in memory, older ones
+        # are appended to the history file, one JSON line each.
+        self.messages: Deque[Message] = deque(maxlen=capacity)
+        self.history_offsets = array("q")  # Byte offset of each spilled message.
+        self._history_file: Optional[BinaryIO] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_history_file"] = None  # Saved alongside the game, by save_history.
+        return state
+
+    def __len__(self) -> int:
+        return len(self.history_offsets) + len(self.messages)
+
     def add_message(
-        self, text: str, fg: Tuple[int, int, int] = color.white, 
+        self, text: str, fg: Tuple[int, int, int] = color.white,
         *, stack: bool = True,
     ) -> None:
         if stack and self.messages and text == self.messages[-1].plain_text:
             self.messages[-1].count += 1
         else:
+            if len(self.messages) == self.messages.maxlen:
+                self.spill(self.messages.popleft())
             self.messages.append(Message(text, fg))
-    
+
+    @property
+    def history_file(self) -> BinaryIO:
+        # An anonymous temporary file, kept open for the whole session, and
+        # removed by the OS once it's closed. Each log has it's own, so no
+        # other game or run can overwrite it.
+        if getattr(self, "_history_file", None) is None:
+            self._history_file = tempfile.TemporaryFile()
+        return self._history_file
+
+    def spill(self, message: Message) -> None:
+        # Append message to the history file.
+        file = self.history_file
+        file.seek(0, io.SEEK_END)  # Reading history moves the position.
+        self.history_offsets.append(file.tell())
+        record = {"text": message.plain_text, "fg": message.fg, "count": message.count}
+        file.write(json.dumps(record).encode() + b"\n")
+
+    def save_history(self, path: str) -> None:
+        # Copy the history file to path, to be kept next to a save.
+        with open(path, "wb") as out:
+            if self.history_offsets:
+                self.history_file.seek(0)
+                shutil.copyfileobj(self.history_file, out)
+
+    def load_history(self, path: str) -> None:
+        # Take the history back from a file written by save_history. If it's
+        # gone, only the messages still in memory can be shown.
+        self._history_file = None
+        try:
+            with open(path, "rb") as file:
+                shutil.copyfileobj(file, self.history_file)
+        except OSError:
+            pass
+
+    def history(self) -> "MessageHistory":
+        return MessageHistory(self, len(self))
+
     def render(
         self, console: Console, x: int, y: int, width: int, height: int,
     ) -> None:
         self.render_messages(console, x, y, width, height, self.messages)
-    
+
     @staticmethod
     def wrap(string: str, width: int) -> Iterable[str]:
         # Return a wrapped text message.
@@ -54,8 +125,45 @@ class MessageLog:
         y_offest = height - 1
 
         for message in reversed(messages):
-            for line in reversed(list(cls.wrap(message.full_text, width))):
+            for line in reversed(message.wrapped(width)):
                 console.print(x, y + y_offest, line, fg = message.fg)
                 y_offest -= 1
                 if y_offest < 0:
                     return  # Ran out of space to print messages.
+
+
+class MessageHistory:
+    """Every message in a MessageLog up to `stop`, including those spilled to
+    disk. Spilled messages are only read once they are iterated over, and are
+    kept afterwards, so paging back and forth doesn't reread them.
+    """
+
+    def __init__(self, log: MessageLog, stop: int, loaded: Optional[Dict[int, Message]] = None) -> None:
+        self.log = log
+        self.stop = stop
+        self.loaded = {} if loaded is None else loaded
+
+    def __len__(self) -> int:
+        return self.stop
+
+    def __getitem__(self, key: slice) -> "MessageHistory":
+        # Only slices from the start are supported, like history[: n].
+        assert key.start in (None, 0) and key.step in (None, 1), "Only history[:stop] is supported."
+        stop = self.stop if key.stop is None else max(0, min(key.stop, self.stop))
+        return MessageHistory(self.log, stop, self.loaded)
+
+    def __reversed__(self) -> Iterator[Message]:
+        spilled = len(self.log.history_offsets)
+        for index in range(self.stop - 1, spilled - 1, -1):
+            yield self.log.messages[index - spilled]
+
+        for index in range(min(self.stop, spilled) - 1, -1, -1):
+            if index not in self.loaded:
+                file = self.log.history_file
+                file.seek(self.log.history_offsets[index])
+                try:
+                    record = json.loads(file.readline())
+                except ValueError:
+                    return  # The history file was lost or cut short.
+                self.loaded[index] = Message(record["text"], tuple(record["fg"]), record["count"])
+            yield self.loaded[index]
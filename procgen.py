@@ -1,13 +1,14 @@
 from __future__ import annotations
 
-from typing import Tuple, Callable, Iterator, Iterable, Optional, TYPE_CHECKING
+from typing import Tuple, Iterable, List, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from entity import Entity
 
 import random
 
-import tcod
+import dill as pickle
+import numpy as np
 
 from game_map import GameMap
 import generated_structures
@@ -18,34 +19,100 @@ import calculator
 import tile_types
 
 
-def random_suitable_pos(
-    room: Room,
-    dungeon: GameMap,
-    criteria: Optional[Callable[[Tuple[int, int], int], bool]] = None,
-    tenacity: float = 1.0,
-) -> Tuple[int, int]:
-    if not criteria:
-        criteria = lambda pos, attempt: not any(entity.pos == pos for entity in dungeon.entities) and dungeon.tiles[pos]["walkable"] and dungeon.tiles[pos] not in tile_types.reserved
+class PlacementGrid:
+    """Tracks which cells of a dungeon are free to place an entity on: walkable,
+    not reserved, like the stairs, and not already occupied. Positions are drawn
+    from a room's free cells directly, and taken as they're drawn.
+
+    Features of the floor's layout that placement rules look for, like corners,
+    are worked out once per grid, from the tiles as they were when it was made.
+    """
+
+    # Bits of wall_neighbors that are set for each kind of corner, indexing
+    # into calculator.adjacent: NW N W, N NE E, W SW S and E S SE.
+    corner_patterns = (
+        0b00001011,
+        0b00010110,
+        0b01101000,
+        0b11010000,
+    )
+
+    def __init__(self, dungeon: GameMap) -> None:
+        self.dungeon = dungeon
+        self.free = dungeon.tiles["walkable"].copy()
+        for tile in tile_types.reserved:
+            self.free &= dungeon.tiles != tile
+        for pos in dungeon.entity_index:
+            self.free[pos] = False
+        self._wall_neighbors: Optional[np.ndarray] = None
+        self._corners: Optional[np.ndarray] = None
+
+    @property
+    def wall_neighbors(self) -> np.ndarray:
+        # A bitmask per cell, with bit i set if the cell at calculator.adjacent[i]
+        # from it is a wall. Cells past the edge of the map count as walls.
+        if self._wall_neighbors is None:
+            width, height = self.free.shape
+            walls = np.pad(~self.dungeon.tiles["walkable"], 1, constant_values=True)
+            self._wall_neighbors = np.zeros((width, height), dtype=np.uint8)
+            for bit, (dx, dy) in enumerate(calculator.adjacent):
+                shifted = walls[1 + dx:1 + dx + width, 1 + dy:1 + dy + height]
+                self._wall_neighbors |= shifted.astype(np.uint8) << bit
+        return self._wall_neighbors
+
+    @property
+    def corners(self) -> np.ndarray:
+        # Open cells tucked into a corner, with walls on two sides and between.
+        if self._corners is None:
+            neighbors = self.wall_neighbors
+            self._corners = self.dungeon.tiles["walkable"].copy()
+            self._corners &= np.logical_or.reduce([
+                neighbors & pattern == pattern for pattern in self.corner_patterns
+            ])
+        return self._corners
+
+    def take(self, pos: Tuple[int, int]) -> None:
+        # Mark pos as no longer free, such as once stairs are placed on it.
+        self.free[pos] = False
+
+    def sample(
+        self, room: Room, k: int = 1, where: Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, int]]:
+        # Up to k distinct free positions in room, in a random order, limited
+        # to the cells set in where if it's given. Fewer are returned only if
+        # the room doesn't have k such cells left.
+        candidates = self.free[room.bounds]
+        if where is not None:
+            candidates = candidates & where[room.bounds]
+        xs, ys = candidates.nonzero()
+        chosen = random.sample(range(len(xs)), min(k, len(xs)))
+        positions = [(room.x1 + int(xs[i]), room.y1 + int(ys[i])) for i in chosen]
+        for pos in positions:
+            self.take(pos)
+        return positions
 
-    i = 0
-    while i < room.area * tenacity:
-        pos = random.randint(room.x1, room.x2), random.randint(room.y1, room.y2)
-        if criteria(pos, i):
-            return pos
-        i += 1
-    
-    raise exceptions.GenerationException(f"Took too long to find a suitable position in {room}, giving up.")
 
 def place_an_entity_randomly(
     room: Room,
     dungeon: GameMap,
     entity: Entity,
+    grid: Optional[PlacementGrid] = None,
 ) -> None:
-    try:
-        pos = random_suitable_pos(room, dungeon)
+    # The entity isn't placed if there isn't any room left for it.
+    place_entities_randomly(room, dungeon, [entity], grid)
+
+def place_entities_randomly(
+    room: Room,
+    dungeon: GameMap,
+    entities: List[Entity],
+    grid: Optional[PlacementGrid] = None,
+) -> None:
+    # Places each entity at a different free position in the room, drawn in one
+    # go. Entities left over once the room is full aren't placed.
+    if grid is None:
+        grid = PlacementGrid(dungeon)
+    for entity, pos in zip(entities, grid.sample(room, len(entities))):
         entity.place(pos, dungeon)
-    except exceptions.GenerationException:
-        pass
 
 def place_entities(
     room: Room,
@@ -54,48 +121,33 @@ def place_entities(
     min_monsters: int = 0,
     max_items: int = None,
     min_items: int = 0,
+    grid: Optional[PlacementGrid] = None,
 ) -> None:
     if max_monsters == None: max_monsters = int(room.area/10)
     number_of_monsters = random.randint(min_monsters, max_monsters)
     if max_items == None: max_items = int(room.area/25)
     number_of_items = random.randint(min_items, max_items)
 
-    for i in range(number_of_monsters):
-        chosen_monster = random.choices(list(factories.entity.distribution.values()), list(factories.entity.distribution.keys()))[0].spawn()
-        place_an_entity_randomly(room, dungeon, chosen_monster)
-    for i in range(number_of_items):
-        chosen_item = random.choices([d[0] for d in factories.item.distribution], [d[1] for d in factories.item.distribution], k = 1)[0]()
-        place_an_entity_randomly(room, dungeon, chosen_item)
+    monsters = random.choices(list(factories.entity.distribution.values()), list(factories.entity.distribution.keys()), k = number_of_monsters)
+    items = random.choices([d[0] for d in factories.item.distribution], [d[1] for d in factories.item.distribution], k = number_of_items)
+    entities = [monster.spawn() for monster in monsters] + [item() for item in items]
+    place_entities_randomly(room, dungeon, entities, grid)
 
 def place_stairs(
     rooms: Iterable[Room],
     dungeon: GameMap,
     up: bool = False,
+    grid: Optional[PlacementGrid] = None,
 ) -> Tuple[int, int]:
-    def suitable(pos: Tuple[int, int], attempt: int) -> bool:
-        # Preferably use a corner, unless it takes too long, and then 
-        # give up and use any point out in the open that fits the other 
-        # requirements.
-        if attempt < 100:
-            neighbors = [dungeon.tiles[calculator.tuple_add(delta, pos)] == tile_types.wall for delta in calculator.adjacent]
-
-            return (not any(entity.pos == pos for entity in dungeon.entities)
-                    and dungeon.tiles[pos]["walkable"]
-                    and dungeon.tiles[pos] not in tile_types.reserved
-                    # Choose a tile that is in a corner.
-                    and ((neighbors[0] and neighbors[1] and neighbors[3])
-                        or (neighbors[1] and neighbors[2] and neighbors[4])
-                        or (neighbors[3] and neighbors[5] and neighbors[6])
-                        or (neighbors[4] and neighbors[6] and neighbors[7])))
-        else:
-            return (not any(entity.pos == pos for entity in dungeon.entities)
-                    and dungeon.tiles[pos]["walkable"]
-                    and dungeon.tiles[pos] not in tile_types.reserved)
+    if grid is None:
+        grid = PlacementGrid(dungeon)
 
     # Try to place stairs in a smaller room first.
     for room in sorted(rooms, key=lambda room: room.area * (random.random() + 1)):
-        try:
-            pos = random_suitable_pos(room, dungeon, suitable)
+        # Preferably use a corner, and otherwise any point out in the open.
+        positions = grid.sample(room, where=grid.corners) or grid.sample(room)
+        if positions:
+            pos = positions[0]
 
             if up:
                 dungeon.tiles[pos] = tile_types.up_stairs
@@ -105,45 +157,103 @@ def place_stairs(
                 dungeon.down_stairs = pos
 
             return pos
-        except exceptions.GenerationException:
-            pass
     raise exceptions.GenerationException("Generation Failed: Couldn't find a suitable place for the stairs.")
 
-# TODO: Parameterize generate dungeon. 
 def generate_dungeon(
     map_width: int, map_height: int,
-    engine: Engine,
+    engine: Optional[Engine],
     floor_num: int,
+    tower_options: Optional[dict] = None,
 ) -> GameMap:
-    player = engine.player
-
+    # Only the first floor needs the engine, to place the player in it.
+    # tower_options are passed on to the Tower, to tune it's parameters.
     dungeon = GameMap(engine, map_width, map_height)
-    
+
+    # The Tower fills the map, less a margin of an eighth on each side.
+    x_margin, y_margin = map_width // 8, map_height // 8
     structures = [
-        generated_structures.Tower(10, 10, 60, 60),
+        generated_structures.Tower(
+            x_margin, y_margin, map_width - 2 * x_margin, map_height - 2 * y_margin,
+            **(tower_options or {}), out=dungeon.tiles,
+        ),
     ]
 
     simple_structures = []
 
     for structure in structures:
-        dungeon.tiles[structure.bounds] = structure.tiles
+        if not np.shares_memory(structure.tiles, dungeon.tiles):  # Not generated in place.
+            dungeon.tiles[structure.bounds] = structure.tiles
         if hasattr(structure, "features"):
             simple_structures.extend(structure.features)
         else:
             simple_structures.append(structure)
 
+    dungeon.room_count = len(simple_structures)
+    grid = PlacementGrid(dungeon)
+
     for structure in simple_structures:
-        place_entities(structure, dungeon)
+        place_entities(structure, dungeon, grid=grid)
 
-    place_stairs(simple_structures, dungeon)  # Always place down stairs.
+    place_stairs(simple_structures, dungeon, grid=grid)  # Always place down stairs.
 
     if not floor_num:  # If this is the first floor, place the player in it, and set it to the current game_map.
-        place_an_entity_randomly(random.choice(simple_structures), dungeon, player)
+        place_an_entity_randomly(random.choice(simple_structures), dungeon, engine.player, grid)
         engine.game_map = dungeon
     else:  # If this is not the first floor, add an up stairs.
-        place_stairs(simple_structures, dungeon, True)
+        place_stairs(simple_structures, dungeon, True, grid)
+
+    dungeon.tiles_changed()
+    dungeon.scheduler.schedule_many(dungeon.actors)
+
+    return dungeon
+
+def generate_manifest(
+    map_width: int, map_height: int,
+    floor_num: int,
+    seed: int,
+) -> bytes:
+    # Generates a floor below the first from seed, and packs it up to be
+    # rebuilt by load_manifest. Runs in a worker process, but leaves the
+    # random state alone so it can run in the game's process just the same.
+    state = random.getstate(), np.random.get_state()
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        dungeon = generate_dungeon(map_width, map_height, None, floor_num)
+    finally:
+        random.setstate(state[0])
+        np.random.set_state(state[1])
+
+    # Entities are detached from the map, so it isn't sent along with them.
+    entities = list(dungeon.entities)
+    for entity in entities:
+        dungeon.remove_entity(entity)
+        del entity.parent
+
+    # Tiles are sent as indexes into the handful of tile types used.
+    palette, tiles = np.unique(dungeon.tiles, return_inverse=True)
+    return pickle.dumps({
+        "size": (map_width, map_height),
+        "palette": palette,
+        "tiles": tiles.reshape(dungeon.tiles.shape).astype(np.uint8),
+        "down_stairs": dungeon.down_stairs,
+        "up_stairs": dungeon.up_stairs,
+        "room_count": dungeon.room_count,
+        "entities": entities,
+    })
+
+def load_manifest(manifest: bytes, engine: Engine) -> GameMap:
+    # Rebuilds a floor packed up by generate_manifest.
+    data = pickle.loads(manifest)
+
+    dungeon = GameMap(engine, *data["size"])
+    dungeon.tiles[...] = data["palette"][data["tiles"]]
+    dungeon.down_stairs, dungeon.up_stairs = data["down_stairs"], data["up_stairs"]
+    dungeon.room_count = data["room_count"]
+    for entity in data["entities"]:
+        entity.game_map = dungeon
 
-    for actor in dungeon.actors:
-        dungeon.add_to_clock(actor)
+    dungeon.tiles_changed()
+    dungeon.scheduler.schedule_many(dungeon.actors)
 
     return dungeon
@@ -0,0 +1,258 @@
+"""Opt-in timing spans around the game's hot paths.
+
+`install` wraps the methods listed in `targets` (and every AI's `perform`) so
+that each call records a span into the profiler's ring buffer. Nothing is
+patched until then, so the game pays nothing for the profiler unless it's
+used, and `uninstall` puts the original methods back.
+
+    profiler = profiling.install()
+    ...  # Play some turns, calling profiler.mark_turn() after each.
+    print("\\n".join(profiler.report()))
+    profiler.write_chrome_trace("trace.json")
+
+The game itself is profiled by setting SCRIPTED_PROFILE to a path prefix
+before running main.py, which writes the report and traces there on exit.
+"""
+from __future__ import annotations
+
+import collections
+import contextlib
+import functools
+import json
+import math
+import time
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class Span(NamedTuple):
+    turn: int
+    stack: Tuple[str, ...]  # Names of the enclosing spans, ending with this one.
+    start: int  # perf_counter_ns at entry.
+    duration: int  # Nanoseconds, including nested spans.
+    own: int  # Nanoseconds, excluding nested spans.
+
+    @property
+    def name(self) -> str:
+        return self.stack[-1]
+
+
+class Profiler:
+    def __init__(self, capacity: int = 100_000) -> None:
+        self.spans: Deque[Span] = collections.deque(maxlen=capacity)
+        self.enabled = True
+        self.turn = 0
+        self.totals: Dict[str, int] = collections.defaultdict(int)  # Nanoseconds per span name, never dropped.
+        self._open: List[list] = []  # [name, start, time spent in nested spans]
+        self._patched: List[Tuple[type, str, Callable]] = []
+
+    def mark_turn(self) -> None:
+        # Spans recorded from now on belong to the next turn.
+        self.turn += 1
+
+    def clear(self) -> None:
+        self.spans.clear()
+        self.totals.clear()
+        self.turn = 0
+
+    def _enter(self, name: str) -> list:
+        frame = [name, time.perf_counter_ns(), 0]
+        self._open.append(frame)
+        return frame
+
+    def _exit(self, frame: list) -> None:
+        duration = time.perf_counter_ns() - frame[1]
+        stack = tuple(open_frame[0] for open_frame in self._open)
+        self._open.pop()
+        if self._open:
+            self._open[-1][2] += duration
+        self.totals[frame[0]] += duration
+        self.spans.append(Span(self.turn, stack, frame[1], duration, duration - frame[2]))
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        # Records the body of a with statement as a span called name.
+        if not self.enabled:
+            yield
+            return
+        frame = self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit(frame)
+
+    def wrap(self, name: str, function: Callable) -> Callable:
+        # Returns function wrapped in a span called name.
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return function(*args, **kwargs)
+
+            frame = self._enter(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._exit(frame)
+        return wrapper
+
+    def patch(self, owner: type, attribute: str, name: Optional[str] = None) -> None:
+        # Replace owner.attribute with a wrapped version, remembering the original.
+        original = owner.__dict__[attribute]
+        self._patched.append((owner, attribute, original))
+        setattr(owner, attribute, self.wrap(name or f"{owner.__name__}.{attribute}", original))
+
+    def mark_turns(self, owner: type, attribute: str) -> None:
+        # Replace owner.attribute with a version that marks a turn whenever it
+        # returns something true, like EventHandler.handle_action does once a
+        # turn has passed.
+        original = owner.__dict__[attribute]
+        self._patched.append((owner, attribute, original))
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            result = original(*args, **kwargs)
+            if result:
+                self.mark_turn()
+            return result
+        setattr(owner, attribute, wrapper)
+
+    def unpatch(self) -> None:
+        while self._patched:
+            owner, attribute, original = self._patched.pop()
+            setattr(owner, attribute, original)
+
+    def durations(self) -> Dict[str, List[int]]:
+        # Every recorded duration, in nanoseconds, grouped by span name.
+        durations: Dict[str, List[int]] = collections.defaultdict(list)
+        for span in self.spans:
+            durations[span.name].append(span.duration)
+        return durations
+
+    def per_turn(self) -> Dict[int, Dict[str, int]]:
+        # Nanoseconds spent in each span name, excluding nested spans, per turn.
+        turns: Dict[int, Dict[str, int]] = collections.defaultdict(lambda: collections.defaultdict(int))
+        for span in self.spans:
+            turns[span.turn][span.name] += span.own
+        return turns
+
+    def percentiles(self, percents: Iterable[float] = (50, 90, 99)) -> Dict[str, Dict[str, float]]:
+        # Percentiles of each span name's duration, in milliseconds.
+        table = {}
+        for name, durations in self.durations().items():
+            durations.sort()
+            row = {"count": len(durations), "max": durations[-1] / 1e6}
+            for percent in percents:
+                index = min(len(durations) - 1, math.ceil(percent / 100 * len(durations)) - 1)
+                row[f"p{percent:g}"] = durations[max(0, index)] / 1e6
+            table[name] = row
+        return table
+
+    @staticmethod
+    def histogram(durations: Iterable[int]) -> Dict[int, int]:
+        # Count durations into power of two buckets of microseconds.
+        buckets: Dict[int, int] = collections.Counter()
+        for duration in durations:
+            buckets[max(0, duration // 1000).bit_length()] += 1
+        return dict(sorted(buckets.items()))
+
+    def report(self, slowest: int = 5, width: int = 40) -> Iterator[str]:
+        # Human readable summary: percentiles and histograms per span, then
+        # the slowest turns broken down by span.
+        table = self.percentiles()
+        yield f"{'span':<28} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+        for name, row in sorted(table.items(), key=lambda item: -item[1]["p99"]):
+            yield f"{name:<28} {row['count']:>7} {row['p50']:9.3f} {row['p90']:9.3f} {row['p99']:9.3f} {row['max']:9.3f}"
+
+        for name, durations in sorted(self.durations().items()):
+            buckets = self.histogram(durations)
+            most = max(buckets.values())
+            yield ""
+            yield name
+            for bucket, count in buckets.items():
+                low = 0 if bucket == 0 else 2 ** (bucket - 1)
+                yield f"  >={low:>8}us {'#' * max(1, count * width // most):<{width}} {count}"
+
+        turns = self.per_turn()
+        yield ""
+        yield f"slowest {min(slowest, len(turns))} of {len(turns)} turns"
+        for turn, names in sorted(turns.items(), key=lambda item: -sum(item[1].values()))[:slowest]:
+            total = sum(names.values())
+            parts = ", ".join(f"{name} {ns / 1e6:.2f}" for name, ns in sorted(names.items(), key=lambda item: -item[1]))
+            yield f"  turn {turn}: {total / 1e6:.2f}ms ({parts})"
+
+    def write_collapsed(self, path: str) -> None:
+        # Write stacks in the collapsed format read by flamegraph.pl and
+        # speedscope, weighted by microseconds spent in each stack.
+        stacks: Dict[Tuple[str, ...], int] = collections.defaultdict(int)
+        for span in self.spans:
+            stacks[span.stack] += span.own
+        with open(path, "w") as file:
+            for stack, ns in sorted(stacks.items()):
+                file.write(f"{';'.join(stack)} {max(1, ns // 1000)}\n")
+
+    def write_chrome_trace(self, path: str) -> None:
+        # Write spans as complete events, for chrome://tracing or Perfetto.
+        origin = min((span.start for span in self.spans), default=0)
+        events = [
+            {
+                "name": span.name, "ph": "X", "pid": 0, "tid": 0,
+                "ts": (span.start - origin) / 1000, "dur": span.duration / 1000,
+                "args": {"turn": span.turn},
+            }
+            for span in self.spans
+        ]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def write_all(self, prefix: str) -> None:
+        # Write the report, a Chrome trace and collapsed stacks, to files
+        # starting with prefix.
+        with open(f"{prefix}.txt", "w") as file:
+            for line in self.report():
+                file.write(line + "\n")
+        self.write_chrome_trace(f"{prefix}.trace.json")
+        self.write_collapsed(f"{prefix}.collapsed")
+
+
+def targets() -> List[Tuple[type, str]]:
+    # The methods wrapped by install, as (class, method name).
+    from components.ai import BaseAI
+    from engine import Engine
+    from game_map import GameMap
+    from message_log import MessageLog
+
+    found = [
+        (Engine, "handle_enemy_turns"),
+        (Engine, "update_fov"),
+        (Engine, "save_as"),
+        (BaseAI, "get_path_to"),
+        (GameMap, "render"),
+        (MessageLog, "render"),
+    ]
+    classes = [BaseAI]
+    while classes:
+        cls = classes.pop()
+        if "perform" in cls.__dict__:
+            found.append((cls, "perform"))
+        classes.extend(cls.__subclasses__())
+    return found
+
+
+profiler: Optional[Profiler] = None
+
+
+def install(capacity: int = 100_000) -> Profiler:
+    # Start profiling the hot paths. Installing twice reuses the profiler.
+    global profiler
+    if profiler is None:
+        profiler = Profiler(capacity)
+        for owner, attribute in targets():
+            profiler.patch(owner, attribute)
+    profiler.enabled = True
+    return profiler
+
+
+def uninstall() -> None:
+    global profiler
+    if profiler is not None:
+        profiler.unpatch()
+        profiler = None
@@ -52,7 +52,7 @@ def render_names_at_mouse_location(
 
     names = ""
     if engine.game_map.in_bounds(game_map_pos) and engine.game_map.visible[game_map_pos]:
-        names = ", ".join(entity.name for entity in engine.game_map.entities if entity.pos == game_map_pos)
+        names = ", ".join(entity.name for entity in engine.game_map.get_entities_at_location(game_map_pos))
 
     console.print(x, y, names, fg=color.ui_subdued)
 
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import heapq
+from typing import Dict, Iterable, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from entity import Actor
+
+
+class Scheduler:
+    """A priority queue deciding which actor takes the next turn.
+
+    Actors are kept in a binary heap of `[tick, order, actor]` entries. Times
+    are stored as integer ticks so that equal acting times always compare
+    equal, and `order` breaks ties in the order actors were scheduled.
+    Cancelled entries are blanked out in place and skipped once they reach
+    the top of the heap.
+    """
+    ticks_per_turn: int = 100
+
+    def __init__(self) -> None:
+        self.time = 0  # The tick of the turn currently being taken.
+        self._heap: List[list] = []
+        self._entries: Dict[Actor, list] = {}
+        self._order = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, actor: Actor) -> bool:
+        return actor in self._entries
+
+    def to_ticks(self, time: float) -> int:
+        return round(time * self.ticks_per_turn)
+
+    def _entry(self, actor: Actor, delay: Optional[float]) -> list:
+        if delay is None: delay = actor.fighter.acting_time
+        self.cancel(actor)
+        entry = [self.time + self.to_ticks(delay), self._order, actor]
+        self._order += 1
+        self._entries[actor] = entry
+        return entry
+
+    def schedule(self, actor: Actor, delay: Optional[float] = None) -> None:
+        # Give actor a turn `delay` turns from now, replacing any turn it
+        # already had. Defaults to the actor's own acting time.
+        heapq.heappush(self._heap, self._entry(actor, delay))
+
+    def schedule_many(self, actors: Iterable[Actor], delay: Optional[float] = None) -> None:
+        # Schedule a batch of actors, rebuilding the heap once at the end.
+        for actor in actors:
+            self._heap.append(self._entry(actor, delay))
+        heapq.heapify(self._heap)
+
+    def cancel(self, actor: Actor) -> bool:
+        # Remove actor's pending turn. Returns False if it had none.
+        entry = self._entries.pop(actor, None)
+        if entry is None:
+            return False
+
+        entry[-1] = None
+        if len(self._heap) > 2 * len(self._entries) + 32:
+            # Too many cancelled entries are lingering, so drop them.
+            self._heap = [entry for entry in self._heap if entry[-1] is not None]
+            heapq.heapify(self._heap)
+        return True
+
+    def reschedule(self, actor: Actor, delay: Optional[float] = None) -> None:
+        # Move actor's pending turn to `delay` turns from now. Actors that
+        # aren't scheduled are left alone.
+        if actor in self._entries:
+            self.schedule(actor, delay)
+
+    def pop(self) -> Actor:
+        # Remove and return the actor with the next turn, advancing time to it.
+        while self._heap:
+            tick, order, actor = heapq.heappop(self._heap)
+            if actor is not None:
+                del self._entries[actor]
+                self.time = tick
+                return actor
+        raise IndexError("pop from an empty Scheduler")
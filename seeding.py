@@ -0,0 +1,9 @@
+import random
+
+import numpy as np
+
+
+def seed_all(seed: int) -> None:
+    # Seed every random generator generation and the game draw from.
+    random.seed(seed)
+    np.random.seed(seed)
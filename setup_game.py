@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import contextlib
 import lzma
 import dill as pickle
 from os import remove
@@ -15,7 +16,8 @@ import keybinds
 from game_map import GameWorld
 
 
-def new_game() -> Engine:
+def new_game(pregenerate: bool = False) -> Engine:
+    # pregenerate generates each next floor ahead of time in a worker process.
     map_width = 80
     map_height = 80
 
@@ -23,8 +25,9 @@ def new_game() -> Engine:
 
     engine = Engine(player)
 
-    engine.game_world = GameWorld(engine, map_width, map_height)
+    engine.game_world = GameWorld(engine, map_width, map_height, pregenerate=pregenerate)
     engine.game_world.generate_floor()
+    engine.game_world.prepare_next_floor()
     engine.update_fov()
     
     engine.message_log.add_message("You boot up.", color.welcome_text)
@@ -32,11 +35,16 @@ def new_game() -> Engine:
 
     return engine
 
-def load_game() -> Engine:
+def load_game(pregenerate: bool = False) -> Engine:
     with open("save", "rb") as file:
         engine = pickle.loads(lzma.decompress(file.read()))
     assert isinstance(engine, Engine)
     remove("save")
+    engine.message_log.load_history("save.history")
+    with contextlib.suppress(FileNotFoundError):
+        remove("save.history")
+    engine.game_world.pregenerate = pregenerate
+    engine.game_world.prepare_next_floor()
     print("Game Loaded.")
     return engine
 
@@ -44,6 +52,10 @@ def load_game() -> Engine:
 class MainMenu(input_handlers.BaseEventHandler):
     """Handle the main menu rendering and input."""
 
+    def __init__(self, pregenerate: bool = False) -> None:
+        # Passed on to the games started from this menu.
+        self.pregenerate = pregenerate
+
     def on_render(self, console: tcod.Console) -> None:
 
         console.print(
@@ -79,12 +91,12 @@ class MainMenu(input_handlers.BaseEventHandler):
             raise SystemExit()
         elif event.sym == tcod.event.K_c:
             try:
-                return input_handlers.MainGameEventHandler(load_game())
+                return input_handlers.MainGameEventHandler(load_game(self.pregenerate))
             except FileNotFoundError:
                 return input_handlers.PopupMessage(self, "No saved game to load.")
             except Exception as exc:
                 return input_handlers.PopupMessage(self, "Failed to load save.")
         elif event.sym == tcod.event.K_n:
-            return input_handlers.MainGameEventHandler(new_game())
+            return input_handlers.MainGameEventHandler(new_game(self.pregenerate))
 
         return None
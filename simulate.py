@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import tcod
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+import actions
+import calculator
+import exceptions
+import profiling
+import setup_game
+from seeding import seed_all
+from engine import Engine
+
+
+# A policy decides the player's next action, or returns None to end the run.
+Policy = Callable[[Engine], Optional[actions.Action]]
+
+# Scripted tokens use numpad directions, as in keybinds.MOVE_KEYS.
+SCRIPT_DIRECTIONS = {
+    "1": (-1, 1), "2": (0, 1), "3": (1, 1),
+    "4": (-1, 0), "5": (0, 0), "6": (1, 0),
+    "7": (-1, -1), "8": (0, -1), "9": (1, -1),
+    ".": (0, 0),
+}
+
+
+class RandomWalk:
+    """Bump in a random direction every turn."""
+
+    def __call__(self, engine: Engine) -> Optional[actions.Action]:
+        return actions.BumpAction(engine.player, calculator.random_direction())
+
+
+class AutoExplore:
+    """Walk towards the nearest unexplored tile, attacking anything in the way.
+    Once nothing is left to explore, head for the down stairs and descend.
+    """
+
+    def __call__(self, engine: Engine) -> Optional[actions.Action]:
+        game_map, player = engine.game_map, engine.player
+
+        goals = game_map.tiles["walkable"] & ~game_map.explored
+        if not goals.any() or not self.reachable(game_map, goals):
+            if game_map.down_stairs is None:
+                return RandomWalk()(engine)
+            if player.pos == game_map.down_stairs:
+                return actions.StairsAction(player)
+            goals = np.zeros_like(goals)
+            goals[game_map.down_stairs] = True
+
+        distance = tcod.path.maxarray(goals.shape, dtype=np.int32)
+        distance[goals] = 0
+        tcod.path.dijkstra2d(distance, game_map.tiles["walkable"].astype(np.int8), 2, 3, out=distance)
+
+        x, y = player.pos
+        best, step = distance[x, y], None
+        for dx, dy in calculator.adjacent:
+            if game_map.in_bounds((x + dx, y + dy)) and distance[x + dx, y + dy] < best:
+                best, step = distance[x + dx, y + dy], (dx, dy)
+        if step is None:
+            return RandomWalk()(engine)
+        return actions.BumpAction(player, step)
+
+    @staticmethod
+    def reachable(game_map, goals: np.ndarray) -> bool:
+        # Whether any goal can be walked to from the player.
+        distance = game_map.get_distance_map(game_map.engine.player.pos)
+        return bool((distance[goals] < np.iinfo(distance.dtype).max).any())
+
+
+class Scripted:
+    """Replay a fixed list of tokens: numpad digits to move, `g` to pick up,
+    `<` or `>` to take the stairs. The run ends when the script does, unless
+    it's set to loop.
+    """
+
+    def __init__(self, script: str, loop: bool = False) -> None:
+        self.tokens = script.split() if " " in script.strip() else list(script.strip())
+        for token in self.tokens:
+            if token not in SCRIPT_DIRECTIONS and token not in "g<>":
+                raise ValueError(f"Unknown script token {token!r}.")
+        self.loop = loop
+        self.index = 0
+
+    def __call__(self, engine: Engine) -> Optional[actions.Action]:
+        if self.index >= len(self.tokens):
+            if not self.loop or not self.tokens:
+                return None
+            self.index = 0
+
+        token = self.tokens[self.index]
+        self.index += 1
+        if token == "g":
+            return actions.PickupAction(engine.player)
+        if token in "<>":
+            return actions.StairsAction(engine.player)
+        return actions.BumpAction(engine.player, SCRIPT_DIRECTIONS[token])
+
+
+POLICIES: Dict[str, Callable[..., Policy]] = {
+    "random": RandomWalk,
+    "explore": AutoExplore,
+    "script": Scripted,
+}
+
+
+# Spans run records around each part of a turn.
+SUBSYSTEMS = ("policy", "player", "enemies", "fov", "render")
+
+
+def peak_rss() -> Optional[int]:
+    # Peak resident set size of this process in bytes, if it can be read.
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run(
+    engine: Engine,
+    policy: Policy,
+    turns: int,
+    *,
+    render: bool = False,
+    max_failures: int = 100,
+    profiler: Optional[profiling.Profiler] = None,
+) -> Dict[str, object]:
+    """Advance engine by up to `turns` player turns, the same way
+    EventHandler.handle_action does, and return timing statistics. With a
+    profiler, the subsystem spans enclose the hot path spans it records.
+    """
+    timer = profiler if profiler is not None else profiling.Profiler(capacity=0)
+    before = {name: timer.totals[name] for name in SUBSYSTEMS}
+    console = tcod.Console(80, 50, order="F") if render else None
+    taken = failures = impossible = 0
+
+    start = time.perf_counter()
+    while taken < turns and engine.player.is_alive:
+        with timer.span("policy"):
+            action = policy(engine)
+        if action is None:
+            break
+
+        try:
+            with timer.span("player"):
+                action.perform()
+        except exceptions.Impossible:
+            impossible += 1
+            failures += 1
+            if failures >= max_failures:
+                break  # The policy is stuck.
+            continue
+        failures = 0
+
+        with timer.span("enemies"):
+            engine.handle_enemy_turns()
+        with timer.span("fov"):
+            engine.update_fov()
+        if console is not None:
+            with timer.span("render"):
+                engine.camera.follow(console)
+                engine.render(console)
+        taken += 1
+        timer.mark_turn()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "turns": taken,
+        "impossible": impossible,
+        "seconds": elapsed,
+        "turns_per_second": taken / elapsed if elapsed else 0.0,
+        "subsystems": {
+            name: (timer.totals[name] - before[name]) / 1e9
+            for name in SUBSYSTEMS if timer.totals[name] > before[name]
+        },
+        "floor": engine.game_world.current_floor_num,
+        "alive": engine.player.is_alive,
+        "peak_rss": peak_rss(),
+    }
+
+
+def iter_report(stats: Dict[str, object]) -> Iterator[str]:
+    yield f"{stats['turns']} turns in {stats['seconds']:.3f}s ({stats['turns_per_second']:.1f} turns/s)"
+    yield f"floor {stats['floor']}, {'alive' if stats['alive'] else 'dead'}, {stats['impossible']} impossible actions"
+    for name, seconds in sorted(stats["subsystems"].items(), key=lambda item: -item[1]):
+        per_turn = seconds / stats["turns"] * 1000 if stats["turns"] else 0.0
+        yield f"  {name:<8} {seconds:8.3f}s {per_turn:8.3f}ms/turn {seconds / stats['seconds'] * 100 if stats['seconds'] else 0:5.1f}%"
+    if stats.get("peak_traced") is not None:
+        yield f"peak traced memory {stats['peak_traced'] / 2**20:.1f} MiB"
+    if stats["peak_rss"] is not None:
+        yield f"peak rss {stats['peak_rss'] / 2**20:.1f} MiB"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the game without a window and time it.")
+    parser.add_argument("-n", "--turns", type=int, default=1000, help="player turns to simulate")
+    parser.add_argument("-p", "--policy", choices=POLICIES, default="explore")
+    parser.add_argument("--script", default="", help="tokens for the script policy, e.g. '6 6 3 g >'")
+    parser.add_argument("--loop", action="store_true", help="repeat the script until --turns is reached")
+    parser.add_argument("-s", "--seed", type=int, default=None)
+    parser.add_argument("--render", action="store_true", help="also render each turn to an offscreen console")
+    parser.add_argument("--symmetric-fov", action="store_true")
+    parser.add_argument("--trace-memory", action="store_true", help="report peak Python allocations (slow)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--profile", action="store_true", help="record spans around the hot paths and report them")
+    parser.add_argument("--trace", metavar="PATH", help="with --profile, write a Chrome trace to PATH")
+    parser.add_argument("--collapsed", metavar="PATH", help="with --profile, write collapsed stacks to PATH")
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        seed_all(args.seed)
+    if args.policy == "script":
+        policy = Scripted(args.script, loop=args.loop)
+    else:
+        policy = POLICIES[args.policy]()
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    setup_start = time.perf_counter()
+    engine = setup_game.new_game(pregenerate=False)
+    if args.symmetric_fov:
+        engine.symmetric_fov = True
+        engine.update_fov()
+    setup = time.perf_counter() - setup_start
+
+    profiler = profiling.install() if args.profile else None
+    stats = run(engine, policy, args.turns, render=args.render, profiler=profiler)
+    stats["setup_seconds"] = setup
+    stats["seed"] = args.seed
+    stats["policy"] = args.policy
+    if args.trace_memory:
+        stats["peak_traced"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print(f"setup {setup:.3f}s")
+        for line in iter_report(stats):
+            print(line)
+
+    if profiler is not None:
+        if not args.json:
+            print()
+            for line in profiler.report():
+                print(line)
+        if args.trace:
+            profiler.write_chrome_trace(args.trace)
+        if args.collapsed:
+            profiler.write_collapsed(args.collapsed)
+        profiling.uninstall()
+
+
+if __name__ == "__main__":
+    main()
@@ -17,7 +17,8 @@ tile_dt = np.dtype(
     [
         ("walkable", np.bool),
         ("transparent", np.bool),
-        ("graphic", graphic_dt),
+        ("graphic", graphic_dt),  # Graphic for when this tile is in FOV.
+        ("dark", graphic_dt),  # Graphic for when this tile is remembered, but not in FOV.
     ]
 )
 
@@ -27,7 +28,9 @@ def new_tile(
     graphic: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
 ) -> np.ndarray:
     """Helper function for defining individual tile types"""
-    return np.array((walkable, transparent, graphic), dtype=tile_dt)
+    ch, fg, bg = graphic
+    dark = ch, tuple(int(c // 1.4) for c in fg), tuple(int(c // 1.4) for c in bg)
+    return np.array((walkable, transparent, graphic, dark), dtype=tile_dt)
 
 # Plain graphics
 SHROUD = np.array((ord(" "), (255, 255, 255), (0, 0, 0)), dtype=graphic_dt)